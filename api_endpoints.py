@@ -3,16 +3,39 @@ Running Coach API - FastAPI Endpoints
 API JSON pour integration Homepage et autres services
 """
 
-from fastapi import FastAPI, HTTPException
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
+import asyncio
+import os
+import threading
+import time
 import main
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Demarre le pre-chauffage du cache au lancement, l'arrete a l'extinction."""
+    task = None
+    if _prewarm_config.get('enabled', True):
+        task = asyncio.create_task(_prewarm_loop())
+    yield
+    if task:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
 app = FastAPI(
     title="Running Coach API",
     description="API pour le dashboard Running Coach - Polarized Data-Driven Training",
-    version=main.VERSION
+    version=main.VERSION,
+    lifespan=lifespan
 )
 
 # CORS pour permettre les appels depuis Homepage
@@ -47,6 +70,11 @@ class DistributionResponse(BaseModel):
     target_easy: int
     target_hard: int
     days_analyzed: int
+    mode: str = "sessions"
+    easy_minutes: Optional[int] = None
+    hard_minutes: Optional[int] = None
+    zone_minutes: Optional[Dict[str, int]] = None
+    stream_coverage: Optional[float] = None
 
 
 class WeatherInfo(BaseModel):
@@ -57,6 +85,27 @@ class WeatherInfo(BaseModel):
     description: Optional[str] = None
     advice: Optional[str] = None
     adjustment_factor: Optional[float] = None
+    hour: Optional[int] = None
+
+
+class PlanDay(BaseModel):
+    date: str
+    category: str
+    type: str
+    tss: int
+    hour: Optional[int] = None
+    heat_index: Optional[float] = None
+    adjustment_factor: float = 1.0
+    description: Optional[str] = None
+    ctl: float
+    atl: float
+    tsb: float
+
+
+class TrainingPlanResponse(BaseModel):
+    days: List[PlanDay]
+    score: float
+    nodes: int
 
 
 class NextWorkoutResponse(BaseModel):
@@ -83,6 +132,7 @@ class TodayWorkoutResponse(BaseModel):
 
 
 class ActivityRecord(BaseModel):
+    id: Optional[str] = None
     date: str
     name: str
     distance_km: float
@@ -118,6 +168,29 @@ class WeeklyStats(BaseModel):
     distance_km: float
     duration_min: int
     tss: int
+    easy_count: int = 0
+    hard_count: int = 0
+
+
+class MonthlyStats(BaseModel):
+    month: str
+    runs: int
+    distance_km: float
+    duration_min: int
+    tss: int
+    easy_count: int
+    hard_count: int
+
+
+class HeatTssDay(BaseModel):
+    date: str
+    runs: int
+    tss: int
+    heat_adjusted_tss: int
+    temp: Optional[float] = None
+    humidity: Optional[float] = None
+    heat_index: Optional[float] = None
+    adjustment_factor: Optional[float] = None
 
 
 class SummaryResponse(BaseModel):
@@ -138,6 +211,152 @@ class HealthResponse(BaseModel):
     version: str
 
 
+class HttpPoolStats(BaseModel):
+    hits: int
+    misses: int
+    hosts: dict
+
+
+class StatsResponse(BaseModel):
+    """Compteurs internes (pool HTTP, appels fusionnes, cache des reponses et des previsions)"""
+    http_pool: HttpPoolStats
+    coalescing: dict
+    response_cache: dict
+    weather_cache: dict
+
+
+# ========================================
+# CACHE DES REPONSES (TTL + stale-while-revalidate)
+# ========================================
+class ResponseCache:
+    """
+    Cache des reponses par endpoint et parametres.
+
+    - age < ttl: valeur servie telle quelle (HIT)
+    - age < ttl + max_stale: derniere bonne valeur servie immediatement (STALE)
+      pendant qu'un seul rafraichissement tourne en arriere-plan
+    - sinon: calcul synchrone (MISS), un seul calcul par cle
+    Les erreurs (HTTPException) ne sont jamais mises en cache.
+    """
+
+    def __init__(self, ttls: dict, max_stale: float = 86400, enabled: bool = True, max_entries: int = 256):
+        self.ttls = ttls
+        self.max_stale = max_stale
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # Ordre LRU: les moins recemment utilisees en tete
+        self._refreshing = set()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.counters = {"hit": 0, "stale": 0, "miss": 0, "refresh_errors": 0}
+
+    def ttl_for(self, endpoint: str, params: tuple) -> float:
+        """TTL de "endpoint:param" si configure, sinon celui de l'endpoint."""
+        if params:
+            specific = f"{endpoint}:{','.join(str(p) for p in params)}"
+            if specific in self.ttls:
+                return self.ttls[specific]
+        return self.ttls.get(endpoint, 300)
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def refresh(self, endpoint: str, params: tuple, compute):
+        """Recalcule et stocke la valeur d'une cle (leve l'exception de compute en cas d'erreur)."""
+        value = compute()
+        key = (endpoint, params)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._key_locks.pop(evicted, None)
+        return value
+
+    def _refresh_in_background(self, endpoint, params, compute):
+        key = (endpoint, params)
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self.refresh(endpoint, params, compute)
+            except Exception as e:
+                self._count("refresh_errors")
+                print(f"ERREUR rafraichissement cache {endpoint}{params}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get(self, endpoint: str, params: tuple, compute):
+        """Retourne (valeur, age en secondes, statut HIT/STALE/MISS)."""
+        if not self.enabled:
+            return compute(), 0.0, "BYPASS"
+
+        key = (endpoint, params)
+        ttl = self.ttl_for(endpoint, params)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                self._entries.move_to_end(key)
+        if entry:
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < ttl:
+                self._count("hit")
+                return value, age, "HIT"
+            if age < ttl + self.max_stale:
+                self._count("stale")
+                self._refresh_in_background(endpoint, params, compute)
+                return value, age, "STALE"
+
+        # Pas de valeur exploitable: un seul calcul synchrone par cle
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[1] < ttl:
+                self._count("hit")
+                return entry[0], time.monotonic() - entry[1], "HIT"
+            self._count("miss")
+            return self.refresh(endpoint, params, compute), 0.0, "MISS"
+
+    def stats(self) -> dict:
+        """Compteurs et age de chaque entree."""
+        now = time.monotonic()
+        with self._lock:
+            entries = {
+                f"{endpoint}:{','.join(str(p) for p in params)}" if params else endpoint: round(now - stored_at, 1)
+                for (endpoint, params), (_, stored_at) in self._entries.items()
+            }
+            return {**self.counters, "entries_age_seconds": entries}
+
+
+_cache_config = main.load_config().get('api_cache', main.DEFAULT_CONFIG['api_cache'])
+response_cache = ResponseCache(
+    ttls={**main.DEFAULT_CONFIG['api_cache']['ttl_seconds'], **_cache_config.get('ttl_seconds', {})},
+    max_stale=_cache_config.get('max_stale_seconds', 86400),
+    enabled=_cache_config.get('enabled', True),
+    max_entries=_cache_config.get('max_entries', 256)
+)
+
+
+def _cached(response: Response, endpoint: str, params: tuple, compute):
+    """Sert un endpoint depuis le cache et expose l'age de la valeur en en-tete."""
+    value, age, status = response_cache.get(endpoint, params, compute)
+    response.headers["X-Cache"] = status
+    response.headers["X-Cache-Age"] = str(int(age))
+    return value
+
+
 # ========================================
 # ENDPOINTS
 # ========================================
@@ -147,17 +366,28 @@ def health_check():
     return HealthResponse(status="healthy", version=main.VERSION)
 
 
-@app.get("/api/summary", response_model=SummaryResponse)
-def get_summary():
+@app.get("/api/stats", response_model=StatsResponse)
+def get_stats():
     """
-    Resume complet pour widget Homepage.
-    Retourne les metriques principales et le prochain workout.
+    Compteurs internes du client Intervals.icu et du cache des reponses.
+    Permet de verifier la reutilisation des connexions keep-alive
+    (hits = connexion reutilisee, misses = nouveau handshake TCP/TLS).
     """
-    wellness = main.get_current_wellness()
+    return StatsResponse(
+        http_pool=main.get_http_pool_stats(),
+        coalescing=main.get_single_flight_stats(),
+        response_cache=response_cache.stats(),
+        weather_cache=main.get_weather_cache_stats()
+    )
+
+
+def _build_summary(snapshot=None):
+    snapshot = snapshot or main.AthleteSnapshot.create()
+    wellness = main.get_current_wellness(snapshot)
     if 'error' in wellness:
         raise HTTPException(status_code=503, detail=wellness['error'])
 
-    next_workout = main.get_next_workout_info()
+    next_workout = main.get_next_workout_info(snapshot)
     if 'error' in next_workout:
         next_workout = {
             'name': 'Erreur',
@@ -165,7 +395,7 @@ def get_summary():
             'tss': 0
         }
 
-    distribution = main.get_distribution(21)
+    distribution = main.get_distribution(21, snapshot)
     if 'error' in distribution:
         distribution = {'easy_percent': 0, 'hard_percent': 0}
 
@@ -182,33 +412,48 @@ def get_summary():
     )
 
 
-@app.get("/api/wellness", response_model=WellnessResponse)
-def get_wellness():
-    """Retourne l'etat de forme actuel (CTL, ATL, TSB, ACWR)."""
-    wellness = main.get_current_wellness()
+@app.get("/api/summary", response_model=SummaryResponse)
+def get_summary(response: Response):
+    """
+    Resume complet pour widget Homepage.
+    Retourne les metriques principales et le prochain workout.
+    """
+    return _cached(response, "summary", (), _build_summary)
+
+
+def _build_wellness(snapshot=None):
+    wellness = main.get_current_wellness(snapshot)
     if 'error' in wellness:
         raise HTTPException(status_code=503, detail=wellness['error'])
     return WellnessResponse(**wellness)
 
 
+@app.get("/api/wellness", response_model=WellnessResponse)
+def get_wellness(response: Response):
+    """Retourne l'etat de forme actuel (CTL, ATL, TSB, ACWR)."""
+    return _cached(response, "wellness", (), _build_wellness)
+
+
+def _build_distribution(days: int = 21, snapshot=None):
+    distribution = main.get_distribution(days, snapshot)
+    if 'error' in distribution:
+        raise HTTPException(status_code=503, detail=distribution['error'])
+    return DistributionResponse(**distribution)
+
+
 @app.get("/api/distribution", response_model=DistributionResponse)
-def get_distribution(days: int = 21):
+def get_distribution(response: Response, days: int = Query(21, ge=1, le=365)):
     """
     Retourne la distribution polarisee (easy vs hard).
 
     Args:
         days: Nombre de jours a analyser (defaut: 21)
     """
-    distribution = main.get_distribution(days)
-    if 'error' in distribution:
-        raise HTTPException(status_code=503, detail=distribution['error'])
-    return DistributionResponse(**distribution)
+    return _cached(response, "distribution", (days,), lambda: _build_distribution(days))
 
 
-@app.get("/api/next-workout", response_model=NextWorkoutResponse)
-def get_next_workout():
-    """Retourne les informations sur la prochaine seance planifiee."""
-    workout = main.get_next_workout_info()
+def _build_next_workout(snapshot=None):
+    workout = main.get_next_workout_info(snapshot)
     if 'error' in workout:
         raise HTTPException(status_code=503, detail=workout['error'])
 
@@ -219,61 +464,137 @@ def get_next_workout():
     return NextWorkoutResponse(**workout)
 
 
-@app.get("/api/today-workout")
-def get_today_workout():
-    """Retourne le workout planifie pour aujourd'hui (depuis Intervals.icu)."""
-    workout = main.get_today_workout()
+@app.get("/api/next-workout", response_model=NextWorkoutResponse)
+def get_next_workout(response: Response):
+    """Retourne les informations sur la prochaine seance planifiee."""
+    return _cached(response, "next-workout", (), _build_next_workout)
+
+
+def _build_training_plan(days: int = 5, snapshot=None):
+    plan = main.get_training_plan(days, snapshot)
+    if 'error' in plan:
+        raise HTTPException(status_code=503, detail=plan['error'])
+    return TrainingPlanResponse(**plan)
+
+
+@app.get("/api/training-plan", response_model=TrainingPlanResponse)
+def get_training_plan(response: Response, days: int = Query(5, ge=1, le=5)):
+    """
+    Retourne le plan easy/hard/repos des prochains jours (hard sur les jours les plus frais).
+
+    Args:
+        days: Horizon en jours, prevision meteo limitee a 5 jours (defaut: 5)
+    """
+    return _cached(response, "training-plan", (days,), lambda: _build_training_plan(days))
+
+
+def _build_today_workout(snapshot=None):
+    workout = main.get_today_workout(snapshot)
     if workout:
         return TodayWorkoutResponse(**workout)
     return {"message": "Pas de workout aujourd'hui", "type": "rest", "tss": 0}
 
 
+@app.get("/api/today-workout")
+def get_today_workout(response: Response):
+    """Retourne le workout planifie pour aujourd'hui (depuis Intervals.icu)."""
+    return _cached(response, "today-workout", (), _build_today_workout)
+
+
+def _build_activities(days: int = 30, snapshot=None):
+    activities = main.get_activity_history(days, snapshot)
+    return [ActivityRecord(**a) for a in activities]
+
+
 @app.get("/api/activities", response_model=List[ActivityRecord])
-def get_activities(days: int = 30):
+def get_activities(response: Response, days: int = Query(30, ge=1, le=730)):
     """
     Retourne l'historique des activites.
 
     Args:
         days: Nombre de jours d'historique (defaut: 30)
     """
-    activities = main.get_activity_history(days)
-    return [ActivityRecord(**a) for a in activities]
+    return _cached(response, "activities", (days,), lambda: _build_activities(days))
+
+
+def _build_wellness_history(days: int = 30, snapshot=None):
+    history = main.get_wellness_history(days, snapshot)
+    return [WellnessRecord(**w) for w in history]
 
 
 @app.get("/api/wellness-history", response_model=List[WellnessRecord])
-def get_wellness_history(days: int = 30):
+def get_wellness_history(response: Response, days: int = Query(30, ge=1, le=730)):
     """
     Retourne l'historique wellness (CTL, ATL, TSB).
 
     Args:
         days: Nombre de jours d'historique (defaut: 30)
     """
-    history = main.get_wellness_history(days)
-    return [WellnessRecord(**w) for w in history]
+    return _cached(response, "wellness-history", (days,), lambda: _build_wellness_history(days))
+
+
+def _build_wellness_history_acwr(days: int = 30, snapshot=None):
+    history = main.get_wellness_history_with_acwr(days, snapshot)
+    return [WellnessRecordWithACWR(**w) for w in history]
 
 
 @app.get("/api/wellness-history-acwr", response_model=List[WellnessRecordWithACWR])
-def get_wellness_history_acwr(days: int = 30):
+def get_wellness_history_acwr(response: Response, days: int = Query(30, ge=1, le=730)):
     """
     Retourne l'historique wellness avec ACWR calcule pour chaque jour.
 
     Args:
         days: Nombre de jours d'historique (defaut: 30)
     """
-    history = main.get_wellness_history_with_acwr(days)
-    return [WellnessRecordWithACWR(**w) for w in history]
+    return _cached(response, "wellness-history-acwr", (days,), lambda: _build_wellness_history_acwr(days))
+
+
+def _build_weekly_tss(weeks: int = 8, snapshot=None):
+    stats = main.get_weekly_tss(weeks, snapshot)
+    return [WeeklyStats(**s) for s in stats]
 
 
 @app.get("/api/weekly-tss", response_model=List[WeeklyStats])
-def get_weekly_tss(weeks: int = 8):
+def get_weekly_tss(response: Response, weeks: int = Query(8, ge=1, le=104)):
     """
     Retourne le TSS par semaine.
 
     Args:
         weeks: Nombre de semaines (defaut: 8)
     """
-    stats = main.get_weekly_tss(weeks)
-    return [WeeklyStats(**s) for s in stats]
+    return _cached(response, "weekly-tss", (weeks,), lambda: _build_weekly_tss(weeks))
+
+
+def _build_monthly_stats(months: int = 12, snapshot=None):
+    stats = main.get_monthly_stats(months, snapshot)
+    return [MonthlyStats(**s) for s in stats]
+
+
+@app.get("/api/monthly-stats", response_model=List[MonthlyStats])
+def get_monthly_stats(response: Response, months: int = Query(12, ge=1, le=60)):
+    """
+    Retourne les agregats par mois calendaire (volume, TSS, seances easy/hard).
+
+    Args:
+        months: Nombre de mois, mois en cours inclus (defaut: 12)
+    """
+    return _cached(response, "monthly-stats", (months,), lambda: _build_monthly_stats(months))
+
+
+def _build_heat_tss(days: int = 180, snapshot=None):
+    history = main.get_heat_tss_history(days, snapshot)
+    return [HeatTssDay(**d) for d in history]
+
+
+@app.get("/api/heat-tss", response_model=List[HeatTssDay])
+def get_heat_tss(response: Response, days: int = Query(180, ge=1, le=730)):
+    """
+    Retourne le TSS brut vs ajuste chaleur par jour de course (meteo historisee).
+
+    Args:
+        days: Nombre de jours (defaut: 180)
+    """
+    return _cached(response, "heat-tss", (days,), lambda: _build_heat_tss(days))
 
 
 # ========================================
@@ -287,6 +608,8 @@ class ReadinessComponent(BaseModel):
     elevation: Optional[float] = None
     avg_3d: Optional[float] = None
     last_night: Optional[float] = None
+    cv: Optional[float] = None
+    deviation: Optional[float] = None
     note: Optional[str] = None
 
 
@@ -298,8 +621,15 @@ class ReadinessResponse(BaseModel):
     recommendations: List[str]
 
 
+def _build_readiness(snapshot=None):
+    readiness = main.get_readiness_score(snapshot)
+    if 'error' in readiness:
+        raise HTTPException(status_code=503, detail=readiness['error'])
+    return ReadinessResponse(**readiness)
+
+
 @app.get("/api/readiness", response_model=ReadinessResponse)
-def get_readiness():
+def get_readiness(response: Response):
     """
     Retourne le readiness score base sur algorithme scientifique multi-facteurs.
 
@@ -309,24 +639,51 @@ def get_readiness():
     - Runners Connect / Outside: Seuil FC repos +5-7 bpm
     - Meta-analysis 2025: ACWR zone optimale 0.8-1.3
     """
-    readiness = main.get_readiness_score()
-    if 'error' in readiness:
-        raise HTTPException(status_code=503, detail=readiness['error'])
-    return ReadinessResponse(**readiness)
+    return _cached(response, "readiness", (), _build_readiness)
+
+
+class ReadinessHistoryDay(BaseModel):
+    date: str
+    readiness_score: float
+    status: str
+    modifiers: Dict[str, float]
+    tsb: Optional[float] = None
+    resting_hr: Optional[float] = None
+    resting_hr_baseline: Optional[float] = None
+    sleep_avg_3d: Optional[float] = None
+    ramp_rate: Optional[float] = None
+    acwr: Optional[float] = None
+    hrv: Optional[float] = None
+    hrv_7d: Optional[float] = None
+    hrv_baseline: Optional[float] = None
+    hrv_cv: Optional[float] = None
+
+
+def _build_readiness_history(days: int = 30, snapshot=None):
+    history = main.get_readiness_history(days, snapshot)
+    return [ReadinessHistoryDay(**day) for day in history]
+
+
+@app.get("/api/readiness-history", response_model=List[ReadinessHistoryDay])
+def get_readiness_history(response: Response, days: int = Query(30, ge=1, le=730)):
+    """
+    Retourne le readiness score jour par jour avec le modificateur de chaque
+    composante (tsb, resting_hr, sleep, ramp_rate, acwr, hrv) et sa valeur.
+
+    Args:
+        days: Nombre de jours d'historique (defaut: 30)
+    """
+    return _cached(response, "readiness-history", (days,), lambda: _build_readiness_history(days))
 
 
 # ========================================
 # ENDPOINT SPECIFIQUE HOMEPAGE
 # ========================================
-@app.get("/api/homepage-widget")
-def get_homepage_widget():
-    """
-    Endpoint optimise pour le widget Homepage.
-    Format simplifie avec valeurs pre-formatees.
-    """
-    wellness = main.get_current_wellness()
-    next_workout = main.get_next_workout_info()
-    distribution = main.get_distribution(21)
+def _build_homepage_widget(snapshot=None):
+    snapshot = snapshot or main.AthleteSnapshot.create()
+    wellness = main.get_current_wellness(snapshot)
+    next_workout = main.get_next_workout_info(snapshot)
+    distribution = main.get_distribution(21, snapshot)
 
     # Determiner le statut ACWR
     acwr = wellness.get('acwr', 1.0)
@@ -363,6 +720,136 @@ def get_homepage_widget():
     }
 
 
+@app.get("/api/homepage-widget")
+def get_homepage_widget(response: Response):
+    """
+    Endpoint optimise pour le widget Homepage.
+    Format simplifie avec valeurs pre-formatees.
+    """
+    return _cached(response, "homepage-widget", (), _build_homepage_widget)
+
+
+# ========================================
+# PRE-CHAUFFAGE DU CACHE (tache de fond)
+# ========================================
+# endpoint -> (builder, parametres par defaut de l'endpoint)
+_WARMABLE_ENDPOINTS = {
+    "summary": (_build_summary, ()),
+    "wellness": (_build_wellness, ()),
+    "distribution": (_build_distribution, (21,)),
+    "next-workout": (_build_next_workout, ()),
+    "training-plan": (_build_training_plan, (5,)),
+    "today-workout": (_build_today_workout, ()),
+    "activities": (_build_activities, (30,)),
+    "wellness-history": (_build_wellness_history, (30,)),
+    "wellness-history-acwr": (_build_wellness_history_acwr, (30,)),
+    "weekly-tss": (_build_weekly_tss, (8,)),
+    "monthly-stats": (_build_monthly_stats, (12,)),
+    "heat-tss": (_build_heat_tss, (180,)),
+    "readiness": (_build_readiness, ()),
+    "readiness-history": (_build_readiness_history, (30,)),
+    "homepage-widget": (_build_homepage_widget, ()),
+}
+
+_prewarm_config = main.load_config().get('api_prewarm', main.DEFAULT_CONFIG['api_prewarm'])
+
+
+def _parse_warm_target(target):
+    """Cible de configuration: "weekly-tss" ou "weekly-tss:12" -> (endpoint, params), None si invalide."""
+    if not isinstance(target, str):
+        return None
+    endpoint, _, param = target.partition(':')
+    if endpoint not in _WARMABLE_ENDPOINTS:
+        return None
+    _, default_params = _WARMABLE_ENDPOINTS[endpoint]
+    if param and default_params:
+        try:
+            value = int(param)
+        except ValueError:
+            return None
+        return (endpoint, (value,)) if value > 0 else None
+    return endpoint, default_params
+
+
+def _load_warm_targets(targets):
+    """Valide les cibles configurees une fois au demarrage (les invalides sont signalees et ignorees)."""
+    parsed_targets = []
+    for target in targets or []:
+        parsed = _parse_warm_target(target)
+        if parsed:
+            parsed_targets.append((target, parsed))
+        else:
+            print(f"Attention: cible de pre-chauffage invalide ignoree: {target!r}")
+    return parsed_targets
+
+
+_warm_targets = _load_warm_targets(_prewarm_config.get('endpoints', []))
+
+
+def prewarm_cache():
+    """
+    Rafraichit les endpoints configures avec un seul snapshot partage:
+    un seul aller-retour amont par ressource pour tout le cycle.
+    """
+    snapshot = main.AthleteSnapshot.create()
+    if not snapshot:
+        return
+
+    # Previsions: une seule requete par maille distincte (lieu principal + lieux partages)
+    try:
+        weather_config = snapshot.config.get('weather', {})
+        locations = [weather_config.get('location', main.DEFAULT_CONFIG['weather']['location'])]
+        locations += weather_config.get('prefetch_locations', [])
+        main.prefetch_weather_cells(snapshot.config, snapshot.weather_api_key, locations)
+    except Exception as e:
+        print(f"ERREUR pre-chauffage meteo: {e}")
+
+    # Archive des flux: les runs recents sont archives en tache de fond
+    # (avant les endpoints: le temps en zone ne lit que l'archive)
+    sync_days = snapshot.config.get('stream_archive', {}).get('background_sync_days', 30)
+    if sync_days > 0:
+        try:
+            main.sync_stream_archive(snapshot.config, snapshot.api, snapshot.activities(sync_days))
+        except Exception as e:
+            print(f"ERREUR synchronisation flux: {e}")
+
+    for target, (endpoint, params) in _warm_targets:
+        builder, _ = _WARMABLE_ENDPOINTS[endpoint]
+        try:
+            response_cache.refresh(endpoint, params, lambda: builder(*params, snapshot=snapshot))
+        except Exception as e:
+            print(f"ERREUR pre-chauffage {target}: {e}")
+
+
+def _marker_mtime():
+    path = _prewarm_config.get('workout_marker_file', '')
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+async def _prewarm_loop():
+    """Pre-chauffe au demarrage, puis a intervalle fixe et des qu'un nouveau workout est ecrit."""
+    interval = _prewarm_config.get('interval_seconds', 240)
+    poll = min(interval, _prewarm_config.get('marker_poll_seconds', 15))
+    last_marker = _marker_mtime()
+
+    while True:
+        try:
+            await asyncio.to_thread(prewarm_cache)
+        except Exception as e:
+            # Un cycle en echec ne doit pas arreter le pre-chauffage
+            print(f"ERREUR cycle de pre-chauffage: {e}")
+        next_run = time.monotonic() + interval
+        while time.monotonic() < next_run:
+            await asyncio.sleep(poll)
+            marker = _marker_mtime()
+            if marker != last_marker:
+                last_marker = marker
+                break
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
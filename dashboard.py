@@ -136,14 +136,23 @@ def main_dashboard():
 
     # Recuperation des donnees
     with st.spinner("Chargement des donnees..."):
-        wellness = main.get_current_wellness()
-        distribution = main.get_distribution(21)
-        today_workout = main.get_today_workout()
-        next_workout = main.get_next_workout_info()
-        activity_history = main.get_activity_history(days)
-        wellness_history = main.get_wellness_history_with_acwr(days)
-        weekly_tss = main.get_weekly_tss(8)
-        readiness = main.get_readiness_score()
+        # Un seul snapshot: chaque ressource Intervals.icu n'est chargee qu'une fois
+        snapshot = main.AthleteSnapshot.create()
+        if snapshot:
+            # Charger d'abord les plages les plus larges, les autres en sont filtrees
+            snapshot.activities(max(days, 8 * 7, 180))
+            snapshot.wellness_range(days + main.READINESS_HISTORY_DAYS)
+        wellness = main.get_current_wellness(snapshot)
+        distribution = main.get_distribution(21, snapshot)
+        today_workout = main.get_today_workout(snapshot)
+        next_workout = main.get_next_workout_info(snapshot)
+        training_plan = main.get_training_plan(snapshot=snapshot)
+        activity_history = main.get_activity_history(days, snapshot)
+        wellness_history = main.get_wellness_history_with_acwr(days, snapshot)
+        weekly_tss = main.get_weekly_tss(8, snapshot)
+        readiness = main.get_readiness_score(snapshot)
+        readiness_history = main.get_readiness_history(days, snapshot)
+        heat_tss = main.get_heat_tss_history(max(days, 180), snapshot)
 
     # Verification des erreurs
     if 'error' in wellness:
@@ -513,6 +522,8 @@ def main_dashboard():
             if next_workout.get('weather'):
                 weather = next_workout['weather']
                 st.markdown("**Meteo prevue:**")
+                if weather.get('hour') is not None:
+                    st.write(f"- Meilleur creneau: {weather['hour']}h")
                 st.write(f"- {weather.get('description', '').capitalize()}")
                 st.write(f"- Temperature: {weather.get('temp', 0):.1f} C")
                 st.write(f"- Ressenti: {weather.get('feels_like', 0):.1f} C")
@@ -526,6 +537,16 @@ def main_dashboard():
     else:
         st.error(f"Erreur: {next_workout.get('error', 'Inconnue')}")
 
+    # --- PLAN MULTI-JOURS ---
+    if training_plan.get('days'):
+        st.markdown("#### Plan des prochains jours")
+        df_plan = pd.DataFrame(training_plan['days'])
+        df_plan['type'] = df_plan['type'].map(lambda t: workout_type_display_map.get(t, 'Repos'))
+        df_plan['hour'] = df_plan['hour'].map(lambda h: f"{h:.0f}h" if pd.notna(h) else '-')
+        df_display = df_plan[['date', 'type', 'tss', 'hour', 'heat_index', 'tsb']].copy()
+        df_display.columns = ['Date', 'Seance', 'TSS', 'Creneau', 'Indice chaleur', 'TSB projete']
+        st.dataframe(df_display, hide_index=True, use_container_width=True)
+
     # ========================================
     # LIGNE 4: Evolution temporelle
     # ========================================
@@ -595,6 +616,38 @@ def main_dashboard():
 
         st.plotly_chart(fig_evolution, use_container_width=True)
 
+        # ========================================
+        # Readiness jour par jour sur la periode
+        # ========================================
+        if readiness_history:
+            st.subheader("Evolution du Readiness Score")
+            df_readiness = pd.DataFrame(readiness_history)
+            df_readiness['date'] = pd.to_datetime(df_readiness['date'])
+
+            fig_readiness_history = go.Figure()
+            fig_readiness_history.add_trace(go.Scatter(
+                x=df_readiness['date'],
+                y=df_readiness['readiness_score'] * 100,
+                mode='lines+markers',
+                name='Readiness',
+                line=dict(color='#9b59b6', width=2),
+                customdata=df_readiness['status'],
+                hovertemplate='%{y:.0f}% - %{customdata}<extra></extra>'
+            ))
+            for threshold, color in [(100, '#3498db'), (85, '#2ecc71'), (70, '#f39c12')]:
+                fig_readiness_history.add_hline(y=threshold, line_dash="dot", line_color=color, opacity=0.5)
+
+            fig_readiness_history.update_layout(
+                height=300,
+                margin=dict(l=20, r=20, t=20, b=20),
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                xaxis=dict(showgrid=False),
+                yaxis=dict(range=[45, 115], showgrid=True, gridcolor='rgba(255,255,255,0.1)'),
+                hovermode='x unified'
+            )
+            st.plotly_chart(fig_readiness_history, use_container_width=True)
+
         # ========================================
         # Graphique ACWR historique avec zones de risque
         # ========================================
@@ -652,6 +705,33 @@ def main_dashboard():
             df_display = df_activities[['date', 'name', 'distance_km', 'duration_min', 'tss']].copy()
             df_display.columns = ['Date', 'Nom', 'Distance (km)', 'Duree (min)', 'TSS']
             st.dataframe(df_display, hide_index=True, use_container_width=True)
+
+            # Flux de la seance choisie, lus depuis l'archive locale (memmap, sans appel reseau)
+            archived = [a for a in activity_history if a.get('id')]
+            if archived:
+                labels = {f"{a['date']} - {a['name']}": a['id'] for a in archived}
+                selected_run = st.selectbox("Flux FC de la seance", options=list(labels.keys()))
+                stream = main.get_activity_stream(labels[selected_run], ("time", "heartrate"))
+                if stream is not None and len(stream['time']):
+                    fig_stream = go.Figure(data=[
+                        go.Scatter(
+                            x=stream['time'] / 60,
+                            y=stream['heartrate'],
+                            mode='lines',
+                            line=dict(color='#e74c3c', width=1)
+                        )
+                    ])
+                    fig_stream.update_layout(
+                        height=200,
+                        margin=dict(l=20, r=20, t=20, b=20),
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        xaxis=dict(title="min", showgrid=False),
+                        yaxis=dict(title="bpm", showgrid=True, gridcolor='rgba(255,255,255,0.1)')
+                    )
+                    st.plotly_chart(fig_stream, use_container_width=True)
+                else:
+                    st.caption("Flux non archive pour cette seance")
         else:
             st.info("Aucune activite trouvee")
 
@@ -690,6 +770,41 @@ def main_dashboard():
             avg_tss = total_tss / len(weekly_tss) if weekly_tss else 0
             st.caption(f"Moyenne: {avg_tss:.0f} TSS/semaine | Total 8 semaines: {total_tss:.0f} TSS")
 
+    # ========================================
+    # LIGNE 6: Impact de la chaleur (meteo historisee)
+    # ========================================
+    if heat_tss:
+        st.divider()
+        st.subheader("TSS brut vs ajuste chaleur")
+
+        df_heat = pd.DataFrame(heat_tss)
+        df_heat['date'] = pd.to_datetime(df_heat['date'])
+        df_heat = df_heat.set_index('date')[['tss', 'heat_adjusted_tss']].resample('W').sum()
+
+        fig_heat = go.Figure()
+        fig_heat.add_trace(go.Bar(
+            x=df_heat.index, y=df_heat['tss'],
+            name='TSS brut', marker_color='#95a5a6'
+        ))
+        fig_heat.add_trace(go.Bar(
+            x=df_heat.index, y=df_heat['heat_adjusted_tss'],
+            name='TSS ajuste chaleur', marker_color='#e67e22'
+        ))
+        fig_heat.update_layout(
+            height=300,
+            barmode='overlay',
+            margin=dict(l=20, r=20, t=20, b=20),
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            xaxis=dict(showgrid=False),
+            yaxis=dict(title="TSS / semaine", showgrid=True, gridcolor='rgba(255,255,255,0.1)'),
+            legend=dict(orientation='h', y=1.1)
+        )
+        st.plotly_chart(fig_heat, use_container_width=True)
+
+        penalized = [d for d in heat_tss if (d.get('adjustment_factor') or 1.0) < 1.0]
+        st.caption(f"{len(penalized)} course(s) penalisee(s) par la chaleur sur {len(heat_tss)}")
+
     # ========================================
     # Footer
     # ========================================
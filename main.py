@@ -4,11 +4,30 @@
 # v2.2: Génère les workouts pour DEMAIN (J+1) pour sync Coros
 
 import requests
+import numpy as np
+import argparse
+import copy
+import fcntl
+import hashlib
+import itertools
 import json
 import os
+import random
 import re
+import sqlite3
+import struct
+import sys
+import threading
+import time as time_module
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import date, timedelta, datetime, time
+from math import exp, log, sqrt
+from statistics import mean
 from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from requests.adapters import HTTPAdapter
 
 VERSION = "2.2.1"
 
@@ -20,14 +39,17 @@ DEFAULT_CONFIG = {
         "easy_target_percent": 80,      # 80% des séances en Z1-Z2
         "hard_target_percent": 20,      # 20% des séances en Z4-Z5
         "min_days_between_hard": 2,     # Min 48h entre séances intenses
-        "analysis_window_days": 21      # Fenêtre d'analyse de la distribution
+        "analysis_window_days": 21,     # Fenêtre d'analyse de la distribution
+        "distribution_mode": "sessions"  # "sessions" (nombre de séances) ou "time" (temps en zone FC)
     },
     "banister": {
         "ctl_days": 42,
         "atl_days": 7,
         "target_tsb": -15.0,
         "alb_lower_bound": -25.0,
-        "tsb_recovery_threshold": -25.0  # TSB en dessous = forcer récup
+        "tsb_recovery_threshold": -25.0,  # TSB en dessous = forcer récup
+        "pmc_source": "intervals",      # "intervals" ou "local" (CTL/ATL recalculés depuis les activités)
+        "pmc_warmup_days": 252          # Historique pour initialiser le modèle local (6 x ctl_days)
     },
     "intensity_factors": {
         "recovery": 0.65,
@@ -74,11 +96,214 @@ DEFAULT_CONFIG = {
             "lat": 48.85,
             "lon": 2.35
         },
-        "workout_hour": 7  # Heure prévue du workout pour la prévision
+        "workout_hour": 7,  # Heure préférée du workout (départage les créneaux équivalents)
+        "workout_window_hours": [6, 21],  # Plage horaire (locale) où chercher le meilleur créneau
+        "grid_cell_degrees": 0.1,       # Maille (≈ 11 km) des prévisions partagées entre lieux proches
+        "prefetch_locations": [],       # Lieux supplémentaires ({"lat", "lon"}) préchargés à chaque cycle
+        "forecast_ttl_seconds": 10800  # Prévision OpenWeatherMap mise à jour toutes les 3 h
+    },
+    "planner": {
+        "horizon_days": 5,              # Jours planifiés (prévision OpenWeatherMap: 5 jours)
+        "heat_weight": 1.0,             # Pénalité par °C d'indice de chaleur au-dessus de 18 (séance hard)
+        "distribution_weight": 2.0      # Pénalité par point % d'écart à la part hard cible
+    },
+    "http": {
+        "pool_connections": 4,          # Nombre d'hôtes gardés en pool
+        "pool_maxsize": 10,             # Connexions keep-alive max par hôte
+        "max_parallel_requests": 6      # Appels amont simultanés (fetch concurrent)
+    },
+    "storage": {
+        "enabled": True,
+        "activity_db": "logs/activities.db",  # Store SQLite local des activités
+        "sync_overlap_days": 2,         # Re-télécharge les N derniers jours (sync tardive)
+        "min_sync_interval_seconds": 60  # Pas de nouvelle sync avant ce délai
+    },
+    "hr_streams": {
+        "max_sample_gap_seconds": 5     # Écart max compté entre deux points (pauses exclues)
+    },
+    "fit_import": {
+        "lthr": None,                   # FC seuil pour la charge (défaut: 87% de max_hr)
+        "max_hr": 190,
+        "workers": None                 # Processus de décodage (défaut: nb de CPU)
+    },
+    "stream_archive": {
+        "directory": "logs/streams",    # Archive append-only des flux (un fichier float32 par canal)
+        "channels": ["time", "heartrate", "velocity_smooth", "cadence", "altitude"],
+        "background_sync_days": 30      # Flux des runs récents archivés par le pré-chauffage API (0 = off)
+    },
+    "api_cache": {
+        "enabled": True,
+        "max_stale_seconds": 86400,     # Valeur périmée servie pendant le rafraîchissement
+        "ttl_seconds": {                # TTL par endpoint (ou "endpoint:param", ex: "activities:365")
+            "summary": 300,
+            "homepage-widget": 300,
+            "wellness": 300,
+            "readiness": 600,
+            "readiness-history": 900,
+            "distribution": 600,
+            "next-workout": 600,
+            "today-workout": 600,
+            "activities": 600,
+            "wellness-history": 900,
+            "wellness-history-acwr": 900,
+            "weekly-tss": 900,
+            "monthly-stats": 1800,
+            "heat-tss": 1800,
+            "training-plan": 600
+        },
+        "max_entries": 256              # Entrées gardées (LRU): borne la mémoire des paramètres clients
+    },
+    "api_prewarm": {
+        "enabled": True,
+        "interval_seconds": 240,        # < TTL du cache: les requêtes restent servies depuis le cache
+        "endpoints": ["summary", "readiness", "wellness-history-acwr", "weekly-tss", "training-plan"],
+        "workout_marker_file": "logs/last_workout.json",  # Écrit par le cron après upload
+        "marker_poll_seconds": 15
     }
 }
 
 
+# ==============================================================================
+# --- SESSION HTTP PARTAGÉE (keep-alive) ---
+# ==============================================================================
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session(pool_connections=None, pool_maxsize=None):
+    """
+    Retourne la session HTTP partagée par tous les clients API.
+
+    Une seule session par processus: les connexions TCP/TLS sont gardées
+    ouvertes (keep-alive) et réutilisées par hôte, y compris entre les
+    threads du threadpool FastAPI. La taille du pool est fixée à la
+    première création.
+    """
+    global _http_session
+    if _http_session is not None:
+        return _http_session
+
+    with _http_session_lock:
+        if _http_session is None:
+            http_config = DEFAULT_CONFIG['http']
+            adapter = HTTPAdapter(
+                pool_connections=pool_connections or http_config['pool_connections'],
+                pool_maxsize=pool_maxsize or http_config['pool_maxsize']
+            )
+            session = requests.Session()
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+    return _http_session
+
+
+def get_http_pool_stats() -> dict:
+    """
+    Compteurs du pool de connexions par hôte.
+
+    - misses: nouvelles connexions ouvertes (handshake TCP/TLS)
+    - hits: requêtes servies par une connexion keep-alive existante
+    """
+    if _http_session is None:
+        return {"hits": 0, "misses": 0, "hosts": {}}
+
+    hosts = {}
+    adapters = {id(a): a for a in _http_session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_count = pool.num_requests
+            new_connections = pool.num_connections
+            hosts[pool.host] = {
+                "requests": requests_count,
+                "misses": new_connections,
+                "hits": max(0, requests_count - new_connections)
+            }
+
+    return {
+        "hits": sum(h['hits'] for h in hosts.values()),
+        "misses": sum(h['misses'] for h in hosts.values()),
+        "hosts": hosts
+    }
+
+
+def fetch_concurrently(tasks: dict, max_workers=None) -> dict:
+    """
+    Exécute des appels amont indépendants en parallèle (pool de threads borné).
+    La latence totale devient celle de l'appel le plus lent.
+
+    tasks: {nom: callable sans argument} → retourne {nom: résultat}
+    """
+    if not tasks:
+        return {}
+    max_workers = max_workers or DEFAULT_CONFIG['http']['max_parallel_requests']
+    with ThreadPoolExecutor(max_workers=min(len(tasks), max_workers)) as pool:
+        futures = {name: pool.submit(task) for name, task in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+# ==============================================================================
+# --- SINGLE-FLIGHT (déduplication des appels concurrents identiques) ---
+# ==============================================================================
+class SingleFlight:
+    """
+    Un seul appel en vol par clé: les appelants concurrents avec la même clé
+    attendent la requête en cours et partagent son résultat (ou son exception).
+    Chaque appelant reçoit sa propre copie: le résultat conservé dans le Future
+    n'est jamais exposé, les appelants peuvent donc le modifier librement.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self._counters = {}
+
+    def do(self, label, key, fn):
+        with self._lock:
+            counters = self._counters.setdefault(label, {"executed": 0, "coalesced": 0})
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+                counters['executed'] += 1
+            else:
+                counters['coalesced'] += 1
+
+        if leader:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                # BaseException aussi (KeyboardInterrupt...): sinon les appelants en attente restent bloqués
+                future.set_exception(e)
+                if not isinstance(e, Exception):
+                    raise
+            finally:
+                with self._lock:
+                    del self._in_flight[key]
+        return copy.deepcopy(future.result())
+
+    def stats(self) -> dict:
+        with self._lock:
+            endpoints = {label: dict(c) for label, c in self._counters.items()}
+        return {
+            "executed": sum(c['executed'] for c in endpoints.values()),
+            "coalesced": sum(c['coalesced'] for c in endpoints.values()),
+            "endpoints": endpoints
+        }
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight_stats() -> dict:
+    """Compteurs d'appels exécutés / fusionnés par endpoint Intervals.icu."""
+    return _single_flight.stats()
+
+
 # ==============================================================================
 # --- API CLIENT ---
 # ==============================================================================
@@ -86,20 +311,30 @@ class IntervalsAPI:
     """Client pour l'API Intervals.icu"""
     BASE_URL = "https://intervals.icu"
 
-    def __init__(self, athlete_id, api_key):
+    def __init__(self, athlete_id, api_key, session=None):
         if not athlete_id or not api_key:
             raise ValueError("Credentials manquants (ATHLETE_ID, API_KEY)")
+        self.session = session or get_http_session()
         self.auth = ("API_KEY", api_key)
         self.athlete_id = athlete_id
         self.athlete_url = f"{self.BASE_URL}/api/v1/athlete/{athlete_id}"
 
+    def _get_json(self, label, url, params=None, timeout=10):
+        """GET JSON dédupliqué: les appels identiques concurrents partagent une seule requête."""
+        key = (url, tuple(sorted((params or {}).items())), self.auth)
+
+        def fetch():
+            response = self.session.get(url, auth=self.auth, params=params, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        return _single_flight.do(label, key, fetch)
+
     def get_wellness(self, for_date: date):
         """Récupère CTL, ATL, TSB depuis wellness."""
         url = f"{self.athlete_url}/wellness/{for_date.isoformat()}"
         try:
-            response = requests.get(url, auth=self.auth, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json("wellness", url)
             return {
                 "ctl": data.get('ctl') or 0,
                 "atl": data.get('atl') or 0,
@@ -116,9 +351,7 @@ class IntervalsAPI:
         url = f"{self.athlete_url}/wellness"
         params = {"oldest": start_date.isoformat(), "newest": end_date.isoformat()}
         try:
-            response = requests.get(url, auth=self.auth, params=params, timeout=15)
-            response.raise_for_status()
-            data = response.json()
+            data = self._get_json("wellness_range", url, params, timeout=15)
             result = []
             for item in data:
                 sleep_secs = item.get('sleepSecs')
@@ -140,32 +373,43 @@ class IntervalsAPI:
     def get_athlete_info(self):
         """Récupère le profil athlète."""
         try:
-            response = requests.get(self.athlete_url, auth=self.auth, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json("athlete", self.athlete_url)
         except Exception as e:
             print(f"ERREUR API athlete: {e}")
             return {}
 
-    def get_activities(self, start_date: date, end_date: date):
-        """Récupère les activités récentes."""
+    def fetch_activities(self, start_date: date, end_date: date):
+        """Récupère les activités d'une plage de dates (lève une exception en cas d'erreur)."""
         url = f"{self.athlete_url}/activities"
         params = {"oldest": start_date.isoformat(), "newest": end_date.isoformat()}
+        return self._get_json("activities", url, params, timeout=15)
+
+    def get_activities(self, start_date: date, end_date: date):
+        """Récupère les activités récentes."""
         try:
-            response = requests.get(url, auth=self.auth, params=params, timeout=15)
-            response.raise_for_status()
-            return response.json()
+            return self.fetch_activities(start_date, end_date)
         except Exception as e:
             print(f"ERREUR API activities: {e}")
             return []
 
+    def fetch_streams(self, activity_id, types):
+        """
+        Récupère les flux d'une activité: {type: np.array float32}.
+        Les types absents de l'activité sont omis (lève une exception en cas d'erreur).
+        """
+        url = f"{self.BASE_URL}/api/v1/activity/{activity_id}/streams"
+        data = self._get_json("streams", url, {"types": ",".join(types)}, timeout=20)
+        return {
+            s['type']: np.array([v if v is not None else np.nan for v in s.get('data') or []], dtype=np.float32)
+            for s in data if s.get('type') in types
+        }
+
     def get_events(self, start_date: date, end_date: date):
         """Récupère les événements planifiés."""
-        url = f"{self.athlete_url}/events?oldest={start_date.isoformat()}&newest={end_date.isoformat()}"
+        url = f"{self.athlete_url}/events"
+        params = {"oldest": start_date.isoformat(), "newest": end_date.isoformat()}
         try:
-            response = requests.get(url, auth=self.auth, timeout=10)
-            response.raise_for_status()
-            return response.json()
+            return self._get_json("events", url, params)
         except Exception as e:
             print(f"ERREUR API events: {e}")
             return []
@@ -174,7 +418,7 @@ class IntervalsAPI:
         """Crée un workout sur le calendrier."""
         url = f"{self.athlete_url}/events"
         try:
-            response = requests.post(url, auth=self.auth, json=workout_data, timeout=10)
+            response = self.session.post(url, auth=self.auth, json=workout_data, timeout=10)
             response.raise_for_status()
             print(f"✓ Workout créé: {workout_data.get('name')}")
             return response.json()
@@ -186,9 +430,7 @@ class IntervalsAPI:
         """Récupère les paramètres spécifiques à un sport (zones HR, LTHR, etc.)."""
         url = f"{self.athlete_url}/sport-settings"
         try:
-            response = requests.get(url, auth=self.auth, timeout=10)
-            response.raise_for_status()
-            settings = response.json()
+            settings = self._get_json("sport_settings", url)
             # Trouver les settings pour le sport demandé
             for s in settings:
                 if sport_type in s.get('types', []):
@@ -205,26 +447,706 @@ class IntervalsAPI:
             return {}
 
 
+# ==============================================================================
+# --- STOCKAGE LOCAL DES ACTIVITÉS (SQLite) ---
+# ==============================================================================
+class ActivityStore:
+    """
+    Store local des activités Intervals.icu d'un athlète, indexé par id d'activité.
+
+    Le premier appel fait un backfill de la plage demandée. Ensuite, chaque
+    sync ne télécharge que le delta depuis le curseur (dernier jour
+    synchronisé), avec quelques jours de recouvrement pour récupérer les
+    activités synchronisées en retard ou dont la charge a été recalculée.
+    Les activités d'une plage re-téléchargée absentes de la réponse
+    (supprimées sur Intervals.icu) sont retirées du store.
+
+    Plusieurs athlètes peuvent partager une base: lignes et curseur de
+    synchronisation sont scopés par athlete_id.
+    """
+
+    def __init__(self, path, athlete_id="", overlap_days=2, min_sync_interval=60):
+        self.path = path
+        self.athlete_id = str(athlete_id)
+        self.overlap_days = overlap_days
+        self.min_sync_interval = min_sync_interval
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS activities (
+                    id TEXT PRIMARY KEY,
+                    start_date_local TEXT NOT NULL,
+                    data TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_activities_start ON activities(start_date_local)")
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(activities)")}
+            # Athlète propriétaire: une base mono-athlète existante est rattachée au premier athlète qui l'ouvre
+            if 'athlete_id' not in columns:
+                conn.execute("ALTER TABLE activities ADD COLUMN athlete_id TEXT")
+            conn.execute("UPDATE activities SET athlete_id = ? WHERE athlete_id IS NULL", (self.athlete_id,))
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_activities_athlete_start ON activities(athlete_id, start_date_local)"
+            )
+            # Temps par zone FC (JSON, secondes) et bornes de zones utilisées
+            if 'zone_seconds' not in columns:
+                conn.execute("ALTER TABLE activities ADD COLUMN zone_seconds TEXT")
+                conn.execute("ALTER TABLE activities ADD COLUMN zone_key TEXT")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)")
+            # Curseur historique (clés non préfixées) repris par le premier athlète
+            conn.execute(
+                "UPDATE OR IGNORE sync_state SET key = ? || ':' || key WHERE key IN ('oldest', 'newest', 'last_sync')",
+                (self.athlete_id,)
+            )
+            # Fichiers FIT déjà importés (empreinte du contenu → activité, NULL si ignoré)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS fit_files (
+                    hash TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    activity_id TEXT
+                )
+            """)
+            # Prévision retenue par athlète et par jour (meilleur créneau), jointe à ses activités par date
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS weather_days (
+                    athlete_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    hour INTEGER,
+                    temp REAL,
+                    humidity REAL,
+                    heat_index REAL,
+                    factor REAL,
+                    description TEXT,
+                    PRIMARY KEY (athlete_id, day)
+                ) WITHOUT ROWID
+            """)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _get_state(self, conn):
+        prefix = f"{self.athlete_id}:"
+        rows = conn.execute(
+            "SELECT key, value FROM sync_state WHERE substr(key, 1, ?) = ?", (len(prefix), prefix)
+        ).fetchall()
+        return {key[len(prefix):]: value for key, value in rows}
+
+    def upsert(self, activities):
+        """
+        Insère ou met à jour des activités (clé = id).
+        Seules les colonnes brutes sont remplacées: le temps en zone déjà calculé est conservé.
+        """
+        rows = [
+            (str(a['id']), self.athlete_id, a.get('start_date_local') or '', json.dumps(a))
+            for a in activities if a.get('id') is not None
+        ]
+        # Une activité Intervals.icu remplace son import FIT (même minute de départ)
+        synced_starts = [row[2][:16] for row in rows if not row[0].startswith(FIT_ID_PREFIX) and row[2]]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO activities (id, athlete_id, start_date_local, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET athlete_id = excluded.athlete_id, "
+                "start_date_local = excluded.start_date_local, data = excluded.data",
+                rows
+            )
+            if synced_starts:
+                conn.executemany(
+                    "DELETE FROM activities WHERE athlete_id = ? AND start_date_local >= ? "
+                    "AND start_date_local < ? AND id LIKE ?",
+                    [(self.athlete_id, *minute_bounds(start), f"{FIT_ID_PREFIX}%") for start in synced_starts]
+                )
+        return len(rows)
+
+    def _prune(self, start_date: date, end_date: date, kept_ids):
+        """Retire les activités synchronisées de [start_date, end_date] absentes de kept_ids (hors imports FIT)."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id FROM activities WHERE athlete_id = ? AND start_date_local >= ? "
+                "AND start_date_local < ? AND id NOT LIKE ?",
+                (self.athlete_id, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat(),
+                 f"{FIT_ID_PREFIX}%")
+            ).fetchall()
+            stale = [(row[0],) for row in rows if row[0] not in kept_ids]
+            conn.executemany("DELETE FROM activities WHERE id = ?", stale)
+        return len(stale)
+
+    def existing_starts(self, starts):
+        """Minutes de départ ("AAAA-MM-JJTHH:MM") déjà présentes dans le store."""
+        found = set()
+        with self._connect() as conn:
+            # Une recherche de plage sur l'index (athlete_id, start_date_local) par minute
+            for start in set(starts):
+                row = conn.execute(
+                    "SELECT 1 FROM activities WHERE athlete_id = ? AND start_date_local >= ? "
+                    "AND start_date_local < ? LIMIT 1",
+                    (self.athlete_id, *minute_bounds(start))
+                ).fetchone()
+                if row:
+                    found.add(start)
+        return found
+
+    def fit_hashes(self):
+        """Empreintes des fichiers FIT déjà traités."""
+        with self._connect() as conn:
+            return {row[0] for row in conn.execute("SELECT hash FROM fit_files")}
+
+    def record_fit_files(self, files):
+        """Enregistre des fichiers FIT traités: [(hash, chemin, id d'activité ou None)]."""
+        with self._connect() as conn:
+            conn.executemany("INSERT OR REPLACE INTO fit_files (hash, path, activity_id) VALUES (?, ?, ?)", files)
+
+    def sync(self, api, start_date: date, end_date: date):
+        """
+        Synchronise le store pour couvrir [start_date, end_date].
+        Retourne False si l'API est injoignable (les données locales restent lisibles).
+        """
+        with self._lock:
+            with self._connect() as conn:
+                state = self._get_state(conn)
+
+            oldest = date.fromisoformat(state['oldest']) if state.get('oldest') else None
+            newest = date.fromisoformat(state['newest']) if state.get('newest') else None
+            last_sync = float(state.get('last_sync', 0))
+
+            ranges = []
+            if oldest is None or newest is None:
+                # Backfill initial
+                ranges.append((start_date, end_date))
+            else:
+                if start_date < oldest:
+                    ranges.append((start_date, oldest - timedelta(days=1)))
+                fresh = (time_module.time() - last_sync) < self.min_sync_interval
+                if end_date > newest or not fresh:
+                    cursor = min(newest, end_date) - timedelta(days=self.overlap_days)
+                    ranges.append((cursor, end_date))
+
+            try:
+                for range_start, range_end in ranges:
+                    fetched = api.fetch_activities(range_start, range_end)
+                    self.upsert(fetched)
+                    self._prune(range_start, range_end,
+                                {str(a['id']) for a in fetched if a.get('id') is not None})
+            except Exception as e:
+                print(f"ERREUR sync activités: {e}")
+                return False
+
+            if ranges:
+                new_oldest = min(oldest, start_date) if oldest else start_date
+                new_newest = max(newest, end_date) if newest else end_date
+                with self._connect() as conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+                        [(f"{self.athlete_id}:oldest", new_oldest.isoformat()),
+                         (f"{self.athlete_id}:newest", new_newest.isoformat()),
+                         (f"{self.athlete_id}:last_sync", str(time_module.time()))]
+                    )
+            return True
+
+    def load_zone_seconds(self, zone_key, ids):
+        """Temps par zone FC déjà calculés avec ces bornes: {id: np.array(5)}."""
+        result = {}
+        ids = list(ids)
+        with self._connect() as conn:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT id, zone_seconds FROM activities WHERE zone_key = ? "
+                    f"AND id IN ({','.join('?' * len(chunk))})",
+                    [zone_key, *chunk]
+                ).fetchall()
+                result.update((activity_id, np.array(json.loads(seconds))) for activity_id, seconds in rows)
+        return result
+
+    def save_zone_seconds(self, zone_key, zone_seconds):
+        """Enregistre des temps par zone {id: secondes par zone} avec les bornes utilisées."""
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE activities SET zone_seconds = ?, zone_key = ? WHERE id = ?",
+                [(json.dumps([round(float(v), 1) for v in seconds]), zone_key, activity_id)
+                 for activity_id, seconds in zone_seconds.items()]
+            )
+
+    def get_activities(self, start_date: date, end_date: date):
+        """Lit les activités locales d'une plage de dates, triées par date."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT data FROM activities WHERE athlete_id = ? AND start_date_local >= ? "
+                "AND start_date_local < ? ORDER BY start_date_local",
+                (self.athlete_id, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat())
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def record_weather(self, rows):
+        """Enregistre la prévision retenue par jour: [(jour ISO, heure, temp, humidité, indice, facteur, description)]."""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO weather_days "
+                "(athlete_id, day, hour, temp, humidity, heat_index, factor, description) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(self.athlete_id, *row) for row in rows]
+            )
+
+    def heat_tss(self, start_date: date, end_date: date):
+        """
+        TSS des runs par jour joint à la météo enregistrée, en une lecture de
+        plage sur l'index des dates: [(jour, runs, tss, temp, humidité, indice, facteur)].
+        """
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT substr(a.start_date_local, 1, 10) AS day, COUNT(*), "
+                "SUM(COALESCE(json_extract(a.data, '$.icu_training_load'), 0)), "
+                "w.temp, w.humidity, w.heat_index, w.factor "
+                "FROM activities a LEFT JOIN weather_days w "
+                "ON w.athlete_id = a.athlete_id AND w.day = substr(a.start_date_local, 1, 10) "
+                "WHERE a.athlete_id = ? AND a.start_date_local >= ? AND a.start_date_local < ? "
+                "AND json_extract(a.data, '$.type') = 'Run' "
+                "GROUP BY day ORDER BY day",
+                (self.athlete_id, start_date.isoformat(), (end_date + timedelta(days=1)).isoformat())
+            ).fetchall()
+
+
+_activity_stores = {}
+_activity_stores_lock = threading.Lock()
+
+
+def minute_bounds(start):
+    """Bornes [début, fin) des start_date_local d'une minute "AAAA-MM-JJTHH:MM" (requête sur l'index)."""
+    return start, start + "~"
+
+
+def get_activity_store(config, athlete_id):
+    """
+    Retourne le store d'activités configuré (un par chemin et par athlète),
+    ou None si désactivé. Lève ValueError sans id d'athlète.
+    """
+    storage_config = config.get('storage', DEFAULT_CONFIG['storage'])
+    if not storage_config.get('enabled', True):
+        return None
+
+    path = storage_config.get('activity_db', DEFAULT_CONFIG['storage']['activity_db'])
+    if not athlete_id:
+        raise ValueError("Credentials manquants (ATHLETE_ID)")
+    athlete_id = str(athlete_id)
+    with _activity_stores_lock:
+        store = _activity_stores.get((path, athlete_id))
+        if store is None:
+            try:
+                store = ActivityStore(
+                    path,
+                    athlete_id=athlete_id,
+                    overlap_days=storage_config.get('sync_overlap_days', 2),
+                    min_sync_interval=storage_config.get('min_sync_interval_seconds', 60)
+                )
+            except (OSError, sqlite3.Error) as e:
+                print(f"ERREUR store activités ({path}): {e}")
+                return None
+            _activity_stores[(path, athlete_id)] = store
+    return store
+
+
+def load_activities(config, api, start_date: date, end_date: date):
+    """Activités de [start_date, end_date] via le store local synchronisé (API directe si désactivé)."""
+    store = get_activity_store(config, api.athlete_id)
+    if store is None:
+        return api.get_activities(start_date, end_date)
+    store.sync(api, start_date, end_date)
+    return store.get_activities(start_date, end_date)
+
+
+# ==============================================================================
+# --- FLUX FC (temps en zone) ---
+# ==============================================================================
+class StreamArchive:
+    """
+    Archive locale append-only des flux d'activités, lue par memory mapping.
+
+    Format colonnaire: un fichier float32 brut par canal ({canal}.f32), tous
+    alignés (même offset et longueur pour une activité, NaN si le canal
+    manque), et un index append-only (index.jsonl: id, offset, longueur).
+    Réécrire une activité ajoute un enregistrement: la dernière entrée de
+    l'index fait foi. Une activité sans flux est indexée avec une longueur
+    nulle et n'est donc jamais re-téléchargée.
+
+    Les lectures sont des vues du memmap (zéro copie, rien n'est chargé en
+    RAM hors des pages lues). Les écritures sont sérialisées entre
+    processus par un verrou fichier: l'index n'est écrit qu'après les
+    données, un lecteur ne voit donc jamais un flux partiel.
+    """
+
+    def __init__(self, directory, channels=None):
+        self.directory = directory
+        self.channels = tuple(channels or DEFAULT_CONFIG['stream_archive']['channels'])
+        self._lock = threading.Lock()
+        self._index = {}
+        self._index_size = 0
+        self._maps = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _refresh_index(self):
+        """Lit les entrées ajoutées à l'index depuis la dernière lecture (autre processus inclus)."""
+        try:
+            size = os.path.getsize(self._path("index.jsonl"))
+        except OSError:
+            return
+        if size <= self._index_size:
+            return
+        with open(self._path("index.jsonl"), 'rb') as f:
+            f.seek(self._index_size)
+            chunk = f.read(size - self._index_size)
+        complete = chunk.rfind(b"\n") + 1
+        for line in chunk[:complete].splitlines():
+            entry = json.loads(line)
+            self._index[entry['id']] = (entry['offset'], entry['length'])
+        self._index_size += complete
+
+    def _map(self, channel, needed):
+        """Memmap en lecture d'un canal, re-mappé seulement si le fichier a grandi."""
+        length, mapped = self._maps.get(channel, (0, None))
+        if mapped is None or length < needed:
+            path = self._path(f"{channel}.f32")
+            length = os.path.getsize(path) // 4 if os.path.exists(path) else 0
+            mapped = np.memmap(path, dtype=np.float32, mode='r', shape=(length,)) if length else np.zeros(0, np.float32)
+            self._maps[channel] = (length, mapped)
+        return mapped
+
+    def __contains__(self, activity_id):
+        with self._lock:
+            self._refresh_index()
+            return str(activity_id) in self._index
+
+    def missing(self, activity_ids):
+        """Ids absents de l'archive."""
+        with self._lock:
+            self._refresh_index()
+            return [i for i in activity_ids if str(i) not in self._index]
+
+    def get(self, activity_id, channels=None):
+        """Vues zéro copie {canal: float32} des flux d'une activité, ou None si absente."""
+        with self._lock:
+            self._refresh_index()
+            entry = self._index.get(str(activity_id))
+            if entry is None:
+                return None
+            offset, length = entry
+            return {
+                channel: self._map(channel, offset + length)[offset:offset + length]
+                for channel in channels or self.channels
+            }
+
+    def append(self, activity_id, streams):
+        """Ajoute les flux {canal: valeurs} d'une activité en fin d'archive."""
+        length = max((len(values) for values in streams.values()), default=0)
+        columns = {}
+        for channel in self.channels:
+            column = np.full(length, np.nan, dtype=np.float32)
+            values = streams.get(channel)
+            if values is not None:
+                column[:len(values)] = values
+            columns[channel] = column
+
+        with self._lock, open(self._path(".lock"), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                # Offset commun: le canal le plus long (une écriture interrompue laisse des canaux décalés)
+                sizes = {
+                    channel: os.path.getsize(self._path(f"{channel}.f32")) // 4
+                    if os.path.exists(self._path(f"{channel}.f32")) else 0
+                    for channel in self.channels
+                }
+                offset = max(sizes.values(), default=0)
+                for channel, column in columns.items():
+                    with open(self._path(f"{channel}.f32"), 'r+b' if sizes[channel] else 'wb') as f:
+                        f.seek(sizes[channel] * 4)
+                        if sizes[channel] < offset:
+                            f.write(np.full(offset - sizes[channel], np.nan, dtype=np.float32).tobytes())
+                        f.write(column.tobytes())
+                with open(self._path("index.jsonl"), 'ab') as f:
+                    entry = {"id": str(activity_id), "offset": offset, "length": length}
+                    f.write((json.dumps(entry) + "\n").encode())
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+_stream_archives = {}
+_stream_archives_lock = threading.Lock()
+
+
+def get_stream_archive(config):
+    """Retourne l'archive de flux configurée (une par répertoire), ou None si inaccessible."""
+    archive_config = config.get('stream_archive', DEFAULT_CONFIG['stream_archive'])
+    directory = archive_config.get('directory', DEFAULT_CONFIG['stream_archive']['directory'])
+    with _stream_archives_lock:
+        archive = _stream_archives.get(directory)
+        if archive is None:
+            try:
+                archive = StreamArchive(directory, archive_config.get('channels'))
+            except OSError as e:
+                print(f"ERREUR archive flux ({directory}): {e}")
+                return None
+            _stream_archives[directory] = archive
+    return archive
+
+
+def load_streams(config, api, activity_ids, channels=None, fetch_missing=True):
+    """
+    Flux {id: {canal: vue float32}} depuis l'archive locale. Les activités
+    absentes sont téléchargées en parallèle (tous les canaux archivés) puis
+    ajoutées, sauf fetch_missing=False (lecture de l'archive seule).
+    """
+    archive = get_stream_archive(config)
+    if archive is None:
+        return {}
+    if not fetch_missing:
+        api = None
+
+    def fetch(activity_id):
+        try:
+            archive.append(activity_id, api.fetch_streams(activity_id, archive.channels))
+        except Exception as e:
+            print(f"ERREUR flux {activity_id}: {e}")
+
+    if api is not None:
+        max_workers = config.get('http', {}).get('max_parallel_requests')
+        fetch_concurrently({i: (lambda i=i: fetch(i)) for i in archive.missing(activity_ids)}, max_workers)
+
+    streams = {}
+    for activity_id in activity_ids:
+        activity_streams = archive.get(activity_id, channels)
+        if activity_streams is not None:
+            streams[activity_id] = activity_streams
+    return streams
+
+
+def sync_stream_archive(config, api, activities):
+    """Archive les flux des runs pas encore présents (synchronisation en tâche de fond)."""
+    ids = [str(a['id']) for a in activities if a.get('type') == 'Run' and a.get('id') is not None]
+    archive = get_stream_archive(config)
+    if archive is None:
+        return 0
+    missing = archive.missing(ids)
+    load_streams(config, api, missing)
+    return len(missing)
+
+
+def get_activity_stream(activity_id, channels=None, config=None):
+    """Flux archivés d'une activité (vues zéro copie), sans appel réseau. None si non archivée."""
+    archive = get_stream_archive(config or load_config())
+    return archive.get(activity_id, channels) if archive else None
+
+
+def load_time_in_zone(config, api, analyzer):
+    """
+    Temps par zone FC de chaque run de l'analyseur: {id: secondes par zone}.
+    Calculé une fois par activité et par bornes de zones (persisté dans le store).
+    Les runs sans FC moyenne, ou dont le flux n'est pas encore archivé
+    (sync_stream_archive, en tâche de fond), sont classés par séance:
+    aucun téléchargement sur le chemin des requêtes.
+    """
+    c = analyzer.columns
+    ids = [i for i, hr in zip(c.ids, c.average_heartrate) if i is not None and hr > 0]
+    zone_key = ",".join(str(edge) for edge in analyzer.zone_edges())
+
+    store = get_activity_store(config, api.athlete_id)
+    zone_seconds = {}
+    if store is not None:
+        try:
+            zone_seconds = store.load_zone_seconds(zone_key, ids)
+        except sqlite3.Error as e:
+            print(f"ERREUR lecture temps en zone: {e}")
+
+    missing = [i for i in ids if i not in zone_seconds]
+    if missing:
+        max_gap = config.get('hr_streams', {}).get('max_sample_gap_seconds', 5)
+        streams = load_streams(config, api, missing, ("time", "heartrate"), fetch_missing=False)
+        computed = analyzer.time_in_zone(
+            {i: (s['time'], s['heartrate']) for i, s in streams.items()}, max_gap
+        )
+        if store is not None and computed:
+            try:
+                store.save_zone_seconds(zone_key, computed)
+            except sqlite3.Error as e:
+                print(f"ERREUR écriture temps en zone: {e}")
+        zone_seconds.update(computed)
+    return zone_seconds
+
+
+def apply_distribution_mode(config, api, analyzer):
+    """Active la distribution au temps en zone si configurée (polarized.distribution_mode = "time")."""
+    if config.get('polarized', {}).get('distribution_mode', 'sessions') == 'time':
+        analyzer.set_zone_seconds(load_time_in_zone(config, api, analyzer))
+    return analyzer
+
+
 # ==============================================================================
 # --- API MÉTÉO ---
 # ==============================================================================
-class WeatherAPI:
-    """Client pour l'API OpenWeatherMap."""
-    BASE_URL = "https://api.openweathermap.org/data/2.5"
+class Forecast:
+    """
+    Prévision 5 jours / pas de 3 h, parsée une seule fois.
 
-    def __init__(self, api_key, lat, lon):
-        self.api_key = api_key
-        self.lat = lat
-        self.lon = lon
+    Les créneaux sont triés par heure locale du lieu (dt + city.timezone),
+    exprimée en secondes depuis l'epoch: la recherche du créneau le plus
+    proche d'une (date, heure) est un bisect, sans re-parser dt_txt.
+    """
 
-    def get_forecast(self, target_date: date, target_hour: int = 7):
+    def __init__(self, data):
+        offset = (data.get('city') or {}).get('timezone', 0)
+        self.items = sorted(data.get('list', []), key=lambda item: item['dt'])
+        self.times = [item['dt'] + offset for item in self.items]
+        # Colonnes numériques pour le scoring vectorisé de tous les créneaux
+        mains = [item.get('main', {}) for item in self.items]
+        temp = np.array([m.get('temp', 20) for m in mains], dtype=float)
+        feels_like = np.array([m.get('feels_like') or np.nan for m in mains], dtype=float)
+        self.temp = np.where(np.isnan(feels_like), temp, feels_like)
+        self.humidity = np.array([m.get('humidity', 50) for m in mains], dtype=float)
+        self.hours = (np.array(self.times, dtype=np.int64) % 86400) // 3600
+
+    def __len__(self):
+        return len(self.items)
+
+    def nearest(self, target_dt: datetime):
+        """Index du créneau le plus proche d'une heure locale (le plus tôt en cas d'égalité)."""
+        if not self.times:
+            return None
+        target = (target_dt - datetime(1970, 1, 1)).total_seconds()
+        i = bisect_left(self.times, target)
+        if i == 0:
+            return 0
+        if i == len(self.times):
+            return i - 1
+        return i - 1 if target - self.times[i - 1] <= self.times[i] - target else i
+
+    def slot(self, i):
+        """Créneau i au format de WeatherAPI.get_forecast."""
+        item = self.items[i]
+        main = item.get('main', {})
+        weather = item.get('weather', [{}])[0]
+        wind = item.get('wind', {})
+        return {
+            'temp': main.get('temp'),
+            'feels_like': main.get('feels_like'),
+            'humidity': main.get('humidity'),
+            'description': weather.get('description', ''),
+            'icon': weather.get('icon', ''),
+            'wind_speed': wind.get('speed', 0),  # m/s
+            'forecast_time': item.get('dt_txt'),
+            'hour': int(self.hours[i])  # Heure locale du créneau
+        }
+
+    def best_slot(self, target_date: date, window=(6, 21), preferred_hour=7):
         """
-        Récupère les prévisions météo pour une date et heure données.
-        Utilise l'API forecast (gratuite, 5 jours, pas de 3h).
+        Index du créneau le plus favorable de target_date dans la plage horaire
+        locale [début, fin]: facteur de chaleur maximal, puis indice de chaleur
+        le plus bas, puis le plus proche de preferred_hour. None si aucun créneau.
         """
-        if not self.api_key:
+        if not self.times:
+            return None
+        day_start = (datetime.combine(target_date, time(0, 0)) - datetime(1970, 1, 1)).total_seconds()
+        lo = bisect_left(self.times, day_start + window[0] * 3600)
+        hi = bisect_right(self.times, day_start + window[1] * 3600)
+        if lo >= hi:
             return None
 
+        heat_index, factor = heat_adjustment_batch(self.temp[lo:hi], self.humidity[lo:hi])
+        # Les créneaux sous 22 °C sont équivalents (facteur 1.0, indice non pénalisant)
+        heat_rank = np.maximum(heat_index, HEAT_INDEX_EDGES[1])
+        order = np.lexsort((np.abs(self.hours[lo:hi] - preferred_hour), heat_rank, -factor))
+        return lo + int(order[0])
+
+
+class ForecastCache:
+    """
+    Prévisions parsées par maille lat/lon arrondie, gardées le temps d'un
+    cycle de mise à jour OpenWeatherMap. Les lieux d'une même maille et les
+    appels concurrents partagent un seul téléchargement.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, ttl, loader):
+        """Prévision en cache pour key si plus récente que ttl, sinon loader() (qui peut lever)."""
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                fresh = entry is not None and time_module.time() - entry[0] < ttl
+                if fresh:
+                    self.hits += 1
+                else:
+                    self.misses += 1
+            if fresh:
+                return entry[1]
+            # Téléchargement hors du verrou global: seuls les appelants de cette maille attendent
+            forecast = loader()
+            with self._lock:
+                self._entries[key] = (time_module.time(), forecast)
+            return forecast
+
+    def stats(self) -> dict:
+        """Taux de succès et âge (s) de la prévision de chaque maille."""
+        now = time_module.time()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+                "cells_age_seconds": {
+                    f"{lat:.4f},{lon:.4f}": round(now - stored_at, 1)
+                    for (lat, lon), (stored_at, _) in self._entries.items()
+                }
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def weather_cell(lat, lon, cell_degrees=None):
+    """Centre de la maille contenant (lat, lon): clé de cache et point de prévision."""
+    cell = cell_degrees or DEFAULT_CONFIG['weather']['grid_cell_degrees']
+    return round(round(lat / cell) * cell, 4), round(round(lon / cell) * cell, 4)
+
+
+_forecast_cache = ForecastCache()
+
+
+class WeatherAPI:
+    """Client pour l'API OpenWeatherMap."""
+    BASE_URL = "https://api.openweathermap.org/data/2.5"
+
+    def __init__(self, api_key, lat, lon, session=None, ttl=None, cell_degrees=None):
+        self.session = session or get_http_session()
+        self.api_key = api_key
+        # Prévision demandée au centre de la maille: identique pour tous les lieux de la maille
+        self.lat, self.lon = weather_cell(lat, lon, cell_degrees)
+        self.ttl = ttl if ttl is not None else DEFAULT_CONFIG['weather']['forecast_ttl_seconds']
+
+    def _download_forecast(self):
         url = f"{self.BASE_URL}/forecast"
         params = {
             "lat": self.lat,
@@ -233,45 +1155,95 @@ class WeatherAPI:
             "units": "metric",
             "lang": "fr"
         }
+        response = self.session.get(url, params=params, timeout=10)
+        response.raise_for_status()
+        return Forecast(response.json())
+
+    def fetch_forecast(self):
+        """Prévision complète de la maille (cache partagé par maille, lève une exception en cas d'erreur)."""
+        return _forecast_cache.get((self.lat, self.lon), self.ttl, self._download_forecast)
+
+    def get_forecast(self, target_date: date, target_hour: int = 7):
+        """
+        Récupère les prévisions météo pour une date et heure données.
+        Utilise l'API forecast (gratuite, 5 jours, pas de 3h), mise en cache par lieu.
+        """
+        if not self.api_key:
+            return None
 
         try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-
-            # Chercher la prévision la plus proche de target_date à target_hour
-            target_dt = datetime.combine(target_date, time(target_hour, 0))
-            best_forecast = None
-            min_diff = float('inf')
-
-            for item in data.get('list', []):
-                forecast_dt = datetime.fromisoformat(item['dt_txt'].replace(' ', 'T'))
-                diff = abs((forecast_dt - target_dt).total_seconds())
-                if diff < min_diff:
-                    min_diff = diff
-                    best_forecast = item
-
-            if best_forecast:
-                main = best_forecast.get('main', {})
-                weather = best_forecast.get('weather', [{}])[0]
-                wind = best_forecast.get('wind', {})
-
-                return {
-                    'temp': main.get('temp'),
-                    'feels_like': main.get('feels_like'),
-                    'humidity': main.get('humidity'),
-                    'description': weather.get('description', ''),
-                    'icon': weather.get('icon', ''),
-                    'wind_speed': wind.get('speed', 0),  # m/s
-                    'forecast_time': best_forecast.get('dt_txt')
-                }
+            forecast = self.fetch_forecast()
+        except Exception as e:
+            print(f"ERREUR API météo: {e}")
+            return None
+
+        # Prévision la plus proche de target_date à target_hour (heure locale)
+        i = forecast.nearest(datetime.combine(target_date, time(target_hour, 0)))
+        return forecast.slot(i) if i is not None else None
 
+    def get_best_forecast(self, target_date: date, window=(6, 21), preferred_hour: int = 7):
+        """
+        Prévision du meilleur créneau de target_date dans la plage horaire,
+        tous les créneaux étant scorés en une passe sur la prévision en cache.
+        Repli sur preferred_hour si la plage ne contient aucun créneau.
+        """
+        if not self.api_key:
             return None
 
+        try:
+            forecast = self.fetch_forecast()
         except Exception as e:
             print(f"ERREUR API météo: {e}")
             return None
 
+        i = forecast.best_slot(target_date, window, preferred_hour)
+        if i is None:
+            i = forecast.nearest(datetime.combine(target_date, time(preferred_hour, 0)))
+        return forecast.slot(i) if i is not None else None
+
+    def get_daily_best_forecasts(self, start_date: date, n_days: int, window=(6, 21), preferred_hour: int = 7):
+        """Meilleur créneau de chacun des n_days jours (None au-delà de l'horizon), une seule prévision."""
+        if not self.api_key:
+            return [None] * n_days
+
+        try:
+            forecast = self.fetch_forecast()
+        except Exception as e:
+            print(f"ERREUR API météo: {e}")
+            return [None] * n_days
+
+        slots = []
+        for k in range(n_days):
+            i = forecast.best_slot(start_date + timedelta(days=k), window, preferred_hour)
+            slots.append(forecast.slot(i) if i is not None else None)
+        return slots
+
+
+# Seuils d'indice de chaleur (°C) et facteur d'intensité / conseil par tranche
+HEAT_INDEX_EDGES = [18, 22, 25, 28, 32, 35]
+HEAT_FACTORS = [1.0, 1.0, 0.95, 0.88, 0.75, 0.60, 0.0]
+HEAT_ADVICE = [
+    "Conditions optimales",                             # Fraîches - optimal pour la performance
+    "Conditions normales",
+    "Chaleur légère - bien s'hydrater",                 # Vigilance
+    "Chaleur modérée - réduire l'intensité",            # Réduction recommandée
+    "Chaleur élevée - privilégier endurance facile",    # Réduction significative
+    "Chaleur dangereuse - sortie matinale uniquement",
+    "Conditions extrêmes - repos recommandé",
+]
+
+
+def heat_adjustment_batch(temp, humidity):
+    """
+    Version vectorisée de calculate_heat_adjustment sur des tableaux de
+    créneaux (température ressentie, humidité): (indice de chaleur, facteur).
+    """
+    temp = np.asarray(temp, dtype=float)
+    humidity = np.asarray(humidity, dtype=float)
+    heat_index = np.where((temp >= 20) & (humidity > 40), temp + 0.05 * (humidity - 40), temp)
+    factor = np.asarray(HEAT_FACTORS)[np.digitize(heat_index, HEAT_INDEX_EDGES)]
+    return heat_index, factor
+
 
 def calculate_heat_adjustment(weather_data):
     """
@@ -299,35 +1271,10 @@ def calculate_heat_adjustment(weather_data):
     else:
         heat_index = temp
 
-    # Déterminer l'ajustement
-    if heat_index < 18:
-        # Conditions fraîches - optimal pour la performance
-        factor = 1.0
-        advice = "Conditions optimales"
-    elif heat_index < 22:
-        # Conditions normales
-        factor = 1.0
-        advice = "Conditions normales"
-    elif heat_index < 25:
-        # Chaleur légère - vigilance
-        factor = 0.95
-        advice = "Chaleur légère - bien s'hydrater"
-    elif heat_index < 28:
-        # Chaleur modérée - réduction recommandée
-        factor = 0.88
-        advice = "Chaleur modérée - réduire l'intensité"
-    elif heat_index < 32:
-        # Chaleur élevée - réduction significative
-        factor = 0.75
-        advice = "Chaleur élevée - privilégier endurance facile"
-    elif heat_index < 35:
-        # Chaleur dangereuse
-        factor = 0.60
-        advice = "Chaleur dangereuse - sortie matinale uniquement"
-    else:
-        # Conditions extrêmes - repos recommandé
-        factor = 0.0
-        advice = "Conditions extrêmes - repos recommandé"
+    # Déterminer l'ajustement (tranches HEAT_INDEX_EDGES)
+    band = bisect_right(HEAT_INDEX_EDGES, heat_index)
+    factor = HEAT_FACTORS[band]
+    advice = HEAT_ADVICE[band]
 
     weather_info = {
         'temp': temp,
@@ -336,15 +1283,370 @@ def calculate_heat_adjustment(weather_data):
         'heat_index': round(heat_index, 1),
         'description': description,
         'adjustment_factor': factor,
-        'advice': advice
+        'advice': advice,
+        'hour': weather_data.get('hour')
     }
 
     return factor, weather_info, advice
 
 
+def fetch_weather_forecast(config, weather_api_key, target_date: date):
+    """Prévision du meilleur créneau de séance dans la plage configurée (None si désactivée ou sans clé)."""
+    weather_config = config.get('weather', DEFAULT_CONFIG['weather'])
+    if not weather_config.get('enabled', True) or not weather_api_key:
+        return None
+
+    location = weather_config.get('location', DEFAULT_CONFIG['weather']['location'])
+    workout_hour = weather_config.get('workout_hour', 7)
+    weather_api = WeatherAPI(
+        api_key=weather_api_key,
+        lat=location['lat'],
+        lon=location['lon'],
+        ttl=weather_config.get('forecast_ttl_seconds'),
+        cell_degrees=weather_config.get('grid_cell_degrees')
+    )
+    window = weather_config.get('workout_window_hours', DEFAULT_CONFIG['weather']['workout_window_hours'])
+    return weather_api.get_best_forecast(target_date, tuple(window), workout_hour)
+
+
+def prefetch_weather_cells(config, weather_api_key, locations):
+    """
+    Précharge en parallèle la prévision de chaque maille distincte parmi
+    locations ([{"lat", "lon"}, ...]): un seul téléchargement par maille.
+    Retourne {(lat, lon) de la maille: succès}.
+    """
+    weather_config = config.get('weather', DEFAULT_CONFIG['weather'])
+    if not weather_config.get('enabled', True) or not weather_api_key:
+        return {}
+
+    cell_degrees = weather_config.get('grid_cell_degrees')
+    cells = {weather_cell(loc['lat'], loc['lon'], cell_degrees) for loc in locations}
+
+    def fetch(cell):
+        try:
+            WeatherAPI(weather_api_key, cell[0], cell[1],
+                       ttl=weather_config.get('forecast_ttl_seconds'),
+                       cell_degrees=cell_degrees).fetch_forecast()
+            return True
+        except Exception as e:
+            print(f"ERREUR API météo ({cell[0]}, {cell[1]}): {e}")
+            return False
+
+    max_workers = config.get('http', {}).get('max_parallel_requests')
+    return fetch_concurrently({cell: (lambda cell=cell: fetch(cell)) for cell in cells}, max_workers)
+
+
+def get_weather_cache_stats() -> dict:
+    """Taux de succès du cache de prévisions et âge par maille."""
+    return _forecast_cache.stats()
+
+
+def fetch_weather_outlook(config, weather_api_key, start_date: date, n_days: int):
+    """Meilleur créneau de séance pour chacun des n_days jours (None par jour si météo indisponible)."""
+    weather_config = config.get('weather', DEFAULT_CONFIG['weather'])
+    if not weather_config.get('enabled', True) or not weather_api_key:
+        return [None] * n_days
+
+    location = weather_config.get('location', DEFAULT_CONFIG['weather']['location'])
+    weather_api = WeatherAPI(
+        api_key=weather_api_key,
+        lat=location['lat'],
+        lon=location['lon'],
+        ttl=weather_config.get('forecast_ttl_seconds'),
+        cell_degrees=weather_config.get('grid_cell_degrees')
+    )
+    window = weather_config.get('workout_window_hours', DEFAULT_CONFIG['weather']['workout_window_hours'])
+    return weather_api.get_daily_best_forecasts(
+        start_date, n_days, tuple(window), weather_config.get('workout_hour', 7)
+    )
+
+
+def record_weather_days(config, athlete_id, start_date: date, slots):
+    """
+    Historise la prévision retenue pour chaque jour depuis start_date (None = ignoré),
+    dans le store de l'athlète. La dernière prévision enregistrée pour un jour
+    remplace les précédentes.
+    """
+    store = get_activity_store(config, athlete_id)
+    known = [(start_date + timedelta(days=k), slot) for k, slot in enumerate(slots) if slot]
+    if store is None or not known:
+        return 0
+
+    temp = [slot.get('feels_like') or slot.get('temp', 20) for _, slot in known]
+    humidity = [slot.get('humidity', 50) for _, slot in known]
+    heat_index, factor = heat_adjustment_batch(temp, humidity)
+    try:
+        store.record_weather([
+            (day.isoformat(), slot.get('hour'), float(temp[i]), float(humidity[i]),
+             round(float(heat_index[i]), 1), float(factor[i]), slot.get('description', ''))
+            for i, (day, slot) in enumerate(known)
+        ])
+    except Exception as e:
+        print(f"ERREUR historique météo: {e}")
+        return 0
+    return len(known)
+
+
+# ==============================================================================
+# --- MODÈLE BANISTER LOCAL (PMC: CTL / ATL / TSB) ---
+# ==============================================================================
+class BanisterModel:
+    """
+    Modèle fitness-fatigue calculé localement depuis icu_training_load.
+
+    Même récurrence exponentielle qu'Intervals.icu:
+        CTL(j) = CTL(j-1) * e^(-1/ctl_days) + charge(j) * (1 - e^(-1/ctl_days))
+    (idem pour ATL avec atl_days). La récurrence est vectorisée par blocs
+    (cumsum pondéré), ce qui calcule plusieurs années en quelques ms.
+    """
+
+    BLOCK_DAYS = 365  # Borne les puissances e^(k/tc) pour rester en float64
+
+    def __init__(self, ctl_days=42, atl_days=7):
+        self.ctl_days = ctl_days
+        self.atl_days = atl_days
+
+    @classmethod
+    def from_config(cls, config):
+        ban_config = config.get('banister', DEFAULT_CONFIG['banister'])
+        return cls(ban_config.get('ctl_days', 42), ban_config.get('atl_days', 7))
+
+    @staticmethod
+    def daily_loads(activities, start_date: date, end_date: date):
+        """Charge journalière (somme des icu_training_load, tous sports) sur [start_date, end_date]."""
+        n_days = (end_date - start_date).days + 1
+        offsets = []
+        loads = []
+        for a in activities:
+            date_str = (a.get('start_date_local') or '')[:10]
+            if not date_str:
+                continue
+            offset = date.fromisoformat(date_str).toordinal() - start_date.toordinal()
+            if 0 <= offset < n_days:
+                offsets.append(offset)
+                loads.append(a.get('icu_training_load') or 0)
+        if not offsets:
+            return np.zeros(n_days)
+        return np.bincount(offsets, weights=loads, minlength=n_days).astype(float)
+
+    @classmethod
+    def _exp_weighted(cls, loads, time_constant, initial=0.0):
+        """y(j) = y(j-1) * a + x(j) * (1 - a), avec a = e^(-1/tc), vectorisé par blocs."""
+        decay = exp(-1.0 / time_constant)
+        out = np.empty(len(loads))
+        state = float(initial)
+        for start in range(0, len(loads), cls.BLOCK_DAYS):
+            block = loads[start:start + cls.BLOCK_DAYS]
+            k = np.arange(1, len(block) + 1)
+            # y(k) = a^k * (y0 + (1 - a) * sum_{i<=k} x(i) * a^-i)
+            values = decay ** k * (state + (1 - decay) * np.cumsum(block * decay ** -k))
+            out[start:start + len(block)] = values
+            state = values[-1]
+        return out
+
+    def compute(self, loads, initial_ctl=0.0, initial_atl=0.0):
+        """
+        Séries CTL/ATL/TSB/ramp rate pour un tableau de charges journalières.
+        initial_ctl/initial_atl: valeurs de la veille du premier jour.
+        """
+        loads = np.asarray(loads, dtype=float)
+        ctl = self._exp_weighted(loads, self.ctl_days, initial_ctl)
+        atl = self._exp_weighted(loads, self.atl_days, initial_atl)
+
+        # Ramp rate Intervals.icu: variation de CTL sur 7 jours
+        previous = np.concatenate((np.full(7, float(initial_ctl)), ctl))[:len(ctl)]
+        return {
+            "ctl": ctl,
+            "atl": atl,
+            "tsb": ctl - atl,
+            "ramp_rate": ctl - previous
+        }
+
+    def series(self, activities, start_date: date, end_date: date, initial_ctl=0.0, initial_atl=0.0):
+        """Historique au format get_wellness_range (sans FC repos/HRV/sommeil)."""
+        pmc = self.compute(self.daily_loads(activities, start_date, end_date), initial_ctl, initial_atl)
+        start_ordinal = start_date.toordinal()
+        return [
+            {
+                "date": date.fromordinal(start_ordinal + i).isoformat(),
+                "ctl": round(float(pmc['ctl'][i]), 2),
+                "atl": round(float(pmc['atl'][i]), 2),
+                "tsb": round(float(pmc['tsb'][i]), 2),
+                "resting_hr": None,
+                "hrv": None,
+                "sleep_hours": None,
+                "ramp_rate": round(float(pmc['ramp_rate'][i]), 2)
+            }
+            for i in range(len(pmc['ctl']))
+        ]
+
+    @staticmethod
+    def deviation(local_series, wellness_range):
+        """Écart absolu max (CTL, ATL) entre le modèle local et Intervals.icu, jours communs."""
+        remote = {w['date']: w for w in wellness_range}
+        ctl_errors = [abs(l['ctl'] - remote[l['date']]['ctl']) for l in local_series if l['date'] in remote]
+        atl_errors = [abs(l['atl'] - remote[l['date']]['atl']) for l in local_series if l['date'] in remote]
+        return {
+            "days": len(ctl_errors),
+            "ctl_max_error": round(max(ctl_errors), 2) if ctl_errors else None,
+            "atl_max_error": round(max(atl_errors), 2) if atl_errors else None
+        }
+
+
 # ==============================================================================
 # --- READINESS SCORE (ALGORITHME SCIENTIFIQUE) ---
 # ==============================================================================
+class RollingMedian:
+    """Médiane glissante des N dernières entrées (fenêtre triée par bisect, valeurs None ignorées)."""
+
+    def __init__(self, window):
+        self.window = window
+        self._entries = deque()
+        self._sorted = []
+
+    def append(self, value):
+        self._entries.append(value)
+        if value is not None:
+            insort(self._sorted, value)
+        if len(self._entries) > self.window:
+            expired = self._entries.popleft()
+            if expired is not None:
+                del self._sorted[bisect_left(self._sorted, expired)]
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def median(self):
+        n = len(self._sorted)
+        if not n:
+            return None
+        mid = n // 2
+        return self._sorted[mid] if n % 2 else (self._sorted[mid - 1] + self._sorted[mid]) / 2
+
+
+class RollingMean:
+    """
+    Moyenne glissante des N dernières entrées (valeurs None ignorées).
+    Fenêtre courte: moyenne exacte (statistics.mean) refaite sur la fenêtre,
+    sans dérive d'arrondi d'une somme courante (seuils comparés à l'égalité près).
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._entries = deque()
+        self._count = 0
+
+    def append(self, value):
+        self._entries.append(value)
+        if value is not None:
+            self._count += 1
+        if len(self._entries) > self.window:
+            if self._entries.popleft() is not None:
+                self._count -= 1
+
+    def __len__(self):
+        return self._count
+
+    def mean(self):
+        if not self._count:
+            return None
+        return mean(value for value in self._entries if value is not None)
+
+    def last(self):
+        """Dernière valeur présente dans la fenêtre."""
+        for value in reversed(self._entries):
+            if value is not None:
+                return value
+        return None
+
+
+class RunningWindowStats:
+    """
+    Somme, somme des carrés et effectif des N dernières entrées (valeurs None
+    ignorées), mis à jour en O(1) par entrée: chaque ajout applique le delta
+    (entrée - entrée expirée), comme la somme cumulée de calculate_readiness_batch.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self._entries = deque()
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.count = 0
+
+    def append(self, value):
+        self._entries.append(value)
+        expired = self._entries.popleft() if len(self._entries) > self.window else None
+        self.count += (value is not None) - (expired is not None)
+        new = value if value is not None else 0.0
+        old = expired if expired is not None else 0.0
+        self.total += new - old
+        self.total_sq += new * new - old * old
+
+    def __len__(self):
+        return self.count
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def std(self):
+        """Écart-type (échantillon) de la fenêtre."""
+        if self.count < 2:
+            return 0.0
+        return sqrt(max(0.0, (self.total_sq - self.total * self.total / self.count) / (self.count - 1)))
+
+
+class ReadinessTracker:
+    """
+    Readiness incrémental: chaque jour ajouté met à jour les fenêtres
+    glissantes (médiane FC repos sur 14 jours, moyenne sommeil sur 3 jours,
+    ln(rMSSD) sur 7 et 60 jours) en O(log w), sans recalcul depuis l'historique.
+    """
+
+    HR_WINDOW = 14
+    SLEEP_WINDOW = 3
+    HRV_WINDOW = 7
+    HRV_BASELINE_WINDOW = 60
+
+    def __init__(self):
+        self.resting_hr = RollingMedian(self.HR_WINDOW)
+        self.sleep = RollingMean(self.SLEEP_WINDOW)
+        self.hrv_week = RunningWindowStats(self.HRV_WINDOW)
+        self.hrv_baseline = RunningWindowStats(self.HRV_BASELINE_WINDOW)
+
+    def push(self, day):
+        """Ajoute un jour aux fenêtres sans le scorer."""
+        self.resting_hr.append(day.get('resting_hr') or None)
+        self.sleep.append(day.get('sleep_hours') or None)
+        hrv = day.get('hrv')
+        ln_hrv = log(hrv) if hrv and hrv > 0 else None
+        self.hrv_week.append(ln_hrv)
+        self.hrv_baseline.append(ln_hrv)
+
+    def score(self, day):
+        """Score du jour (qui doit être le dernier ajouté)."""
+        return _score_readiness_day(day, self.resting_hr, self.sleep, self.hrv_week, self.hrv_baseline)
+
+    def append(self, day):
+        self.push(day)
+        return self.score(day)
+
+
+def readiness_series(wellness_history: list) -> list:
+    """Readiness de chaque jour de l'historique en une passe (O(n log w))."""
+    tracker = ReadinessTracker()
+    series = []
+    for day in wellness_history:
+        result = tracker.append(day)
+        series.append({
+            "date": day.get('date'),
+            "readiness_score": result['readiness_score'],
+            "status": result['status'],
+            "modifiers": {name: c['modifier'] for name, c in result['components'].items()}
+        })
+    return series
+
+
 def calculate_readiness_score(wellness_history: list) -> dict:
     """
     Calcule un score de préparation basé sur des seuils scientifiques validés.
@@ -354,14 +1656,13 @@ def calculate_readiness_score(wellness_history: list) -> dict:
     - PMC Sleep Studies: Seuil déficit sommeil < 6h cumulé
     - Runners Connect / Outside: Seuil FC repos +5-7 bpm
     - Intervals.icu: RampRate > 2.0 = progression trop rapide
+    - Plews et al. (2012): ln(rMSSD) 7j vs baseline 60j (± 0.5 SD)
 
     Retourne un dict avec:
     - readiness_score: multiplicateur de charge (0.5 à 1.1)
     - components: détail de chaque facteur
     - recommendations: conseils basés sur les données
     """
-    from statistics import median, mean
-
     if not wellness_history or len(wellness_history) < 1:
         return {
             "readiness_score": 1.0,
@@ -369,7 +1670,15 @@ def calculate_readiness_score(wellness_history: list) -> dict:
             "recommendations": ["Données insuffisantes pour l'analyse"]
         }
 
-    today = wellness_history[-1]
+    tracker = ReadinessTracker()
+    for day in wellness_history:
+        tracker.push(day)
+    return tracker.score(wellness_history[-1])
+
+
+def _score_readiness_day(today: dict, resting_hr: RollingMedian, sleep: RollingMean,
+                         hrv_week: RunningWindowStats, hrv_baseline: RunningWindowStats) -> dict:
+    """Score d'un jour à partir des fenêtres glissantes FC repos, sommeil et HRV (voir calculate_readiness_score)."""
     recommendations = []
     components = {}
 
@@ -403,10 +1712,8 @@ def calculate_readiness_score(wellness_history: list) -> dict:
     # 2. FC Repos - Élévation vs baseline (seuil scientifique: +5-7 bpm)
     # Sources: Runners Connect, Outside Online, études 1985/2015
     # =========================================================================
-    hr_values = [w.get('resting_hr') for w in wellness_history[-14:] if w.get('resting_hr')]
-
-    if hr_values and len(hr_values) >= 3:
-        baseline_hr = median(hr_values)
+    if len(resting_hr) >= 3:
+        baseline_hr = resting_hr.median()
         current_hr = today.get('resting_hr', baseline_hr)
         hr_elevation = current_hr - baseline_hr if current_hr else 0
 
@@ -435,10 +1742,8 @@ def calculate_readiness_score(wellness_history: list) -> dict:
     # Sources: PMC Sleep and Athletic Performance, Gatorade SSI
     # Seuil: < 6h en moyenne = déficit dangereux
     # =========================================================================
-    sleep_values = [w.get('sleep_hours') for w in wellness_history[-3:] if w.get('sleep_hours')]
-
-    if sleep_values:
-        avg_sleep_3d = mean(sleep_values)
+    if len(sleep):
+        avg_sleep_3d = sleep.mean()
 
         if avg_sleep_3d < 6.0:
             sleep_modifier = 0.75
@@ -454,7 +1759,7 @@ def calculate_readiness_score(wellness_history: list) -> dict:
 
         components['sleep'] = {
             'avg_3d': round(avg_sleep_3d, 1),
-            'last_night': sleep_values[-1] if sleep_values else None,
+            'last_night': sleep.last(),
             'modifier': sleep_modifier,
             'threshold': 'Scientific: <6h avg = dangerous deficit, 7-9h = recommended'
         }
@@ -510,10 +1815,42 @@ def calculate_readiness_score(wellness_history: list) -> dict:
         'threshold': 'Meta-analysis 2025: 0.8-1.3 = optimal, >1.5 = high risk'
     }
 
+    # =========================================================================
+    # 6. HRV - Moyenne 7 jours de ln(rMSSD) vs baseline 60 jours
+    # Source: Plews et al. 2012/2013, zone normale = baseline ± 0.5 SD
+    # =========================================================================
+    if len(hrv_week) >= 3 and len(hrv_baseline) >= 14:
+        hrv_7d = hrv_week.mean()
+        hrv_mean = hrv_baseline.mean()
+        hrv_sd = hrv_baseline.std()
+        deviation = (hrv_7d - hrv_mean) / hrv_sd if hrv_sd > 0 else 0.0
+
+        if deviation < -1.0:
+            hrv_modifier = 0.8
+            recommendations.append(f"HRV nettement sous la baseline ({deviation:.1f} SD): fatigue / stress élevé")
+        elif deviation < -0.5:
+            hrv_modifier = 0.9
+            recommendations.append(f"HRV sous la zone normale ({deviation:.1f} SD): récupération incomplète")
+        else:
+            hrv_modifier = 1.0
+
+        components['hrv'] = {
+            'value': round(hrv_7d, 2),
+            'baseline': round(hrv_mean, 2),
+            'cv': round(hrv_sd / hrv_mean * 100, 1),
+            'deviation': round(deviation, 2),
+            'last_night': today.get('hrv'),
+            'modifier': hrv_modifier,
+            'threshold': 'Plews 2012: ln(rMSSD) 7j < baseline 60j - 0.5 SD = fatigue'
+        }
+    else:
+        hrv_modifier = 1.0
+        components['hrv'] = {'value': None, 'modifier': 1.0, 'note': 'Données insuffisantes'}
+
     # =========================================================================
     # Score final = produit des modificateurs
     # =========================================================================
-    final_score = tsb_modifier * hr_modifier * sleep_modifier * ramp_modifier * acwr_modifier
+    final_score = tsb_modifier * hr_modifier * sleep_modifier * ramp_modifier * acwr_modifier * hrv_modifier
     final_score = max(0.5, min(1.1, final_score))
 
     # Interprétation du score
@@ -534,21 +1871,234 @@ def calculate_readiness_score(wellness_history: list) -> dict:
     }
 
 
+READINESS_COMPONENTS = ("tsb", "resting_hr", "sleep", "ramp_rate", "acwr", "hrv")
+
+# Historique wellness nécessaire au readiness (baseline HRV de 60 jours)
+READINESS_HISTORY_DAYS = ReadinessTracker.HRV_BASELINE_WINDOW - 1
+READINESS_STATUSES = np.array(["Repos recommandé", "Prudence", "Modéré", "Prêt"])
+
+
+def _running_window_sums(values, window):
+    """
+    Somme, somme des carrés et effectif glissants (NaN ignorés) par somme
+    cumulée des deltas (entrée - entrée expirée): mêmes opérations, dans
+    le même ordre, que RunningWindowStats.
+    """
+    present = ~np.isnan(values)
+    new = np.where(present, values, 0.0)
+    old = np.concatenate([np.zeros(min(window, len(new))), new[:-window]]) if len(new) else new
+    old_present = np.concatenate([np.zeros(min(window, len(new)), dtype=bool), present[:-window]])
+    total = np.cumsum(new - old)
+    total_sq = np.cumsum(new * new - old * old)
+    count = np.cumsum(present.astype(np.int64) - old_present)
+    return total, total_sq, count
+
+
+def _rolling_windows(values, window):
+    """Fenêtres glissantes (n, window) des N dernières entrées, complétées par NaN au début."""
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return np.lib.stride_tricks.sliding_window_view(padded, window)
+
+
+def calculate_readiness_batch(wellness_history: list) -> dict:
+    """
+    Variante vectorisée de calculate_readiness_score sur tout un historique
+    (sortie de get_wellness_range): chaque modificateur est une recherche
+    de seuil (np.digitize) sur des tableaux, sans boucle par jour.
+
+    Retourne des tableaux alignés sur les jours:
+    - modifiers: matrice (n, 6), colonnes READINESS_COMPONENTS
+    - readiness_score, status, et les valeurs sous-jacentes de chaque facteur
+    """
+    n = len(wellness_history)
+
+    def column(key, missing=np.nan):
+        return np.array([w.get(key) or missing for w in wellness_history], dtype=np.float64)
+
+    ctl = column('ctl', 0)
+    atl = column('atl', 0)
+    tsb = np.array([w.get('tsb', (w.get('ctl') or 0) - (w.get('atl') or 0)) for w in wellness_history],
+                   dtype=np.float64).reshape(n)
+    resting_hr = column('resting_hr')
+    sleep_hours = column('sleep_hours')
+    ramp_rate = column('ramp_rate')
+    hrv = column('hrv')
+
+    # 1. TSB: < -25, < -15, < -5, sinon 1.0
+    tsb_modifier = np.array([0.5, 0.75, 0.9, 1.0])[np.digitize(tsb, [-25, -15, -5])]
+
+    # 2. FC repos vs médiane des 14 dernières entrées (fenêtres triées, NaN en fin)
+    windows = np.sort(_rolling_windows(resting_hr, ReadinessTracker.HR_WINDOW), axis=1)
+    hr_count = np.count_nonzero(~np.isnan(windows), axis=1)
+    upper = np.take_along_axis(windows, (np.maximum(hr_count, 1) // 2)[:, None], axis=1)[:, 0]
+    lower = np.take_along_axis(windows, (np.maximum(hr_count - 1, 0) // 2)[:, None], axis=1)[:, 0]
+    hr_baseline = np.where(hr_count >= 3, (upper + lower) / 2, np.nan)
+    # Jour sans FC repos: élévation nulle (comme calculate_readiness_score)
+    hr_elevation = np.where(np.isnan(resting_hr), 0, resting_hr - hr_baseline)
+    hr_modifier = np.where(
+        hr_count >= 3, np.array([1.0, 0.85, 0.7])[np.digitize(np.nan_to_num(hr_elevation), [5, 7])], 1.0
+    )
+
+    # 3. Sommeil: moyenne des 3 dernières entrées
+    windows = _rolling_windows(sleep_hours, ReadinessTracker.SLEEP_WINDOW)
+    sleep_count = np.count_nonzero(~np.isnan(windows), axis=1)
+    sleep_sum = np.nansum(windows, axis=1)
+    sleep_avg = np.divide(sleep_sum, sleep_count, out=np.full(n, np.nan), where=sleep_count > 0)
+    sleep_modifier = np.where(
+        sleep_count > 0, np.array([0.75, 0.90, 1.0, 1.05])[np.digitize(np.nan_to_num(sleep_avg), [6.0, 7.0, 8.5])], 1.0
+    )
+
+    # 4. RampRate > 2.0
+    ramp_modifier = np.where(np.nan_to_num(ramp_rate) > 2.0, 0.85, 1.0)
+
+    # 5. ACWR: > 1.3, > 1.5
+    acwr = np.divide(atl, ctl, out=np.ones(n), where=ctl > 0)
+    acwr_modifier = np.array([1.0, 0.9, 0.8])[np.digitize(acwr, [1.3, 1.5], right=True)]
+
+    # 6. HRV: ln(rMSSD) moyenne 7 j vs moyenne et écart-type 60 j
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ln_hrv = np.where(hrv > 0, np.log(hrv), np.nan)
+    week_total, _, week_count = _running_window_sums(ln_hrv, ReadinessTracker.HRV_WINDOW)
+    base_total, base_total_sq, base_count = _running_window_sums(ln_hrv, ReadinessTracker.HRV_BASELINE_WINDOW)
+    hrv_valid = (week_count >= 3) & (base_count >= 14)
+    hrv_7d = np.divide(week_total, week_count, out=np.full(n, np.nan), where=hrv_valid)
+    hrv_mean = np.divide(base_total, base_count, out=np.full(n, np.nan), where=hrv_valid)
+    variance = np.divide(base_total_sq - base_total * base_total / np.maximum(base_count, 1),
+                         base_count - 1, out=np.zeros(n), where=base_count >= 2)
+    hrv_sd = np.sqrt(np.maximum(variance, 0.0))
+    hrv_deviation = np.divide(hrv_7d - hrv_mean, hrv_sd, out=np.zeros(n), where=hrv_valid & (hrv_sd > 0))
+    hrv_modifier = np.where(hrv_valid, np.array([0.8, 0.9, 1.0])[np.digitize(hrv_deviation, [-1.0, -0.5])], 1.0)
+
+    modifiers = np.column_stack([tsb_modifier, hr_modifier, sleep_modifier, ramp_modifier, acwr_modifier, hrv_modifier])
+    score = np.clip(
+        tsb_modifier * hr_modifier * sleep_modifier * ramp_modifier * acwr_modifier * hrv_modifier, 0.5, 1.1
+    )
+
+    return {
+        "dates": [w.get('date') for w in wellness_history],
+        "modifiers": modifiers,
+        # round() Python (et non np.round) pour des arrondis identiques au calcul jour par jour
+        "readiness_score": np.array([round(x, 2) for x in score.tolist()]),
+        "status": READINESS_STATUSES[np.digitize(score, [0.7, 0.85, 1.0])],
+        "tsb": tsb,
+        "resting_hr": resting_hr,
+        "resting_hr_baseline": hr_baseline,
+        "sleep_avg_3d": sleep_avg,
+        "ramp_rate": ramp_rate,
+        "acwr": acwr,
+        "hrv": hrv,
+        "hrv_7d": hrv_7d,
+        "hrv_baseline": hrv_mean,
+        "hrv_cv": np.divide(hrv_sd * 100, hrv_mean, out=np.full(n, np.nan), where=hrv_valid)
+    }
+
+
 # ==============================================================================
 # --- ANALYSEUR DE DONNÉES ---
 # ==============================================================================
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+HARD_KEYWORDS = ['interval', 'fractionn', 'tempo', 'threshold', 'seuil',
+                 'speed', 'vma', 'vo2', 'fartlek', 'hard']
+HARD_PATTERN = re.compile("|".join(map(re.escape, HARD_KEYWORDS)))
+
+class ActivityColumns:
+    """
+    Représentation colonnaire compacte des runs (un tableau NumPy par métrique).
+
+    Remplace les dicts JSON Intervals.icu (des dizaines de clés chacun) pour
+    les calculs: les métriques deviennent des réductions vectorisées. Les
+    valeurs manquantes valent 0 (même sémantique que `a.get(...) or 0`).
+    Les activités sans date ont l'ordinal 0 et sont triées en tête.
+    Les ids (None si absent) servent de clé au temps en zone par activité.
+    """
+
+    FLOAT_FIELDS = ("moving_time", "distance", "average_heartrate", "max_heartrate",
+                    "icu_intensity", "icu_training_load", "variability_index")
+
+    def __init__(self, ordinal, name_hard, ids=None, **columns):
+        self.ordinal = ordinal
+        self.name_hard = name_hard
+        self.ids = ids if ids is not None else [None] * len(ordinal)
+        for field in self.FLOAT_FIELDS:
+            setattr(self, field, columns[field])
+
+    def __len__(self):
+        return len(self.ordinal)
+
+    def __getitem__(self, index):
+        """Colonnes d'une tranche de lignes (vues NumPy, sans copie)."""
+        return ActivityColumns(
+            self.ordinal[index], self.name_hard[index], ids=self.ids[index],
+            **{field: getattr(self, field)[index] for field in self.FLOAT_FIELDS}
+        )
+
+    def concat(self, other):
+        """Colonnes de self suivies de celles de other (activités datées après)."""
+        return ActivityColumns(
+            np.concatenate([self.ordinal, other.ordinal]),
+            np.concatenate([self.name_hard, other.name_hard]),
+            ids=self.ids + other.ids,
+            **{field: np.concatenate([getattr(self, field), getattr(other, field)]) for field in self.FLOAT_FIELDS}
+        )
+
+    @classmethod
+    def from_activities(cls, activities):
+        """Construit les colonnes depuis des activités triées par start_date_local."""
+        n = len(activities)
+        ordinal = np.zeros(n, dtype=np.int32)
+        name_hard = np.zeros(n, dtype=bool)
+        ids = [None] * n
+        columns = {field: np.zeros(n, dtype=np.float32) for field in cls.FLOAT_FIELDS}
+
+        for i, a in enumerate(activities):
+            date_str = (a.get('start_date_local') or '')[:10]
+            if date_str:
+                ordinal[i] = date.fromisoformat(date_str).toordinal()
+            if a.get('id') is not None:
+                ids[i] = str(a['id'])
+            name_hard[i] = HARD_PATTERN.search((a.get('name') or '').lower()) is not None
+            for field in cls.FLOAT_FIELDS:
+                columns[field][i] = a.get(field) or 0
+
+        return cls(ordinal, name_hard, ids=ids, **columns)
+
+
 class DataAnalyzer:
     """Analyse les données d'entraînement pour les décisions."""
 
-    def __init__(self, activities, athlete_info):
-        self.activities = [a for a in activities if a.get('type') == 'Run']
+    def __init__(self, activities, athlete_info, today=None, columns=None):
+        if columns is None:
+            self.activities = sorted(
+                (a for a in activities if a.get('type') == 'Run'),
+                key=lambda a: a.get('start_date_local') or ''
+            )
+            # Colonnes triées par date (ordinaux pour les recherches par bisect)
+            self.columns = ActivityColumns.from_activities(self.activities)
+        else:
+            # Runs déjà triés et colonnes alignées tenus par l'appelant (simulation): ni tri ni re-parsing
+            self.activities = activities
+            self.columns = columns
         self.athlete_info = athlete_info or {}
+        # Date de référence des fenêtres glissantes (aujourd'hui, ou un jour passé en backtest)
+        self.today = today or datetime.now().date()
+
+        self._first_dated = int(np.searchsorted(self.columns.ordinal, 1))
 
         # Calculer les métriques de base
         self.max_hr = self._compute_max_hr()
         self.threshold_hr = self._compute_threshold_hr()
         self.avg_easy_pace = self._compute_avg_easy_pace()
 
+        # Bitmap des séances intenses et dernière séance intense
+        self.hard = self._compute_hard_flags()
+        self.zone_seconds = None
+        hard_dated = np.flatnonzero(self.hard[self._first_dated:])
+        self._last_hard_date = (
+            date.fromordinal(int(self.columns.ordinal[self._first_dated + hard_dated[-1]]))
+            if len(hard_dated) else None
+        )
+
     def _compute_max_hr(self):
         """Détermine la FC max depuis les données."""
         # D'abord depuis le profil
@@ -556,11 +2106,7 @@ class DataAnalyzer:
             return self.athlete_info['max_hr']
 
         # Sinon depuis les activités
-        max_observed = 0
-        for a in self.activities:
-            if a.get('max_heartrate'):
-                max_observed = max(max_observed, a['max_heartrate'])
-
+        max_observed = int(self.columns.max_heartrate.max()) if len(self.columns) else 0
         return max_observed if max_observed > 0 else 190
 
     def _compute_threshold_hr(self):
@@ -571,125 +2117,190 @@ class DataAnalyzer:
 
     def _compute_avg_easy_pace(self):
         """Calcule la pace moyenne en endurance (min/km)."""
-        easy_paces = []
-        for a in self.activities:
-            # Filtre les runs faciles (IF < 0.80 ou avg HR < 85% max)
-            avg_hr = a.get('average_heartrate', 0)
-            if avg_hr > 0 and avg_hr < self.max_hr * 0.80:
-                if a.get('moving_time') and a.get('distance') and a['distance'] > 0:
-                    pace_sec_km = a['moving_time'] / (a['distance'] / 1000)
-                    pace_min_km = pace_sec_km / 60
-                    if 4.0 <= pace_min_km <= 9.0:  # Filtre les valeurs aberrantes
-                        easy_paces.append(pace_min_km)
-
-        if easy_paces:
-            return sum(easy_paces) / len(easy_paces)
+        c = self.columns
+        # Filtre les runs faciles (avg HR < 80% max) avec durée et distance valides
+        valid = (c.average_heartrate > 0) & (c.average_heartrate < self.max_hr * 0.80)
+        valid &= (c.moving_time > 0) & (c.distance > 0)
+        pace_min_km = np.divide(c.moving_time, c.distance / 1000, out=np.zeros(len(c)), where=valid) / 60
+        valid &= (pace_min_km >= 4.0) & (pace_min_km <= 9.0)  # Filtre les valeurs aberrantes
+
+        if valid.any():
+            return float(pace_min_km[valid].mean())
         return 6.0  # Défaut: 6:00 min/km
 
+    def _compute_hard_flags(self):
+        """
+        Classification intense/facile de toutes les activités en une passe vectorisée:
+        nom (mots-clés), IF > 0.85, FC moy > 88% FC max pendant > 20 min, VI > 1.08.
+        """
+        c = self.columns
+        hard = c.name_hard.copy()
+        hard |= c.icu_intensity > 85
+        if self.max_hr > 0:
+            hard |= (c.average_heartrate / self.max_hr > 0.88) & (c.moving_time / 60 > 20)
+        hard |= c.variability_index > 1.08
+        return hard
+
+    def _index_range(self, start_date: date, end_date: date = None):
+        """Bornes [lo, hi) des activités datées de [start_date, end_date] (bornes incluses)."""
+        ordinal = self.columns.ordinal
+        lo = max(self._first_dated, int(np.searchsorted(ordinal, start_date.toordinal(), side='left')))
+        hi = int(np.searchsorted(ordinal, end_date.toordinal(), side='right')) if end_date else len(ordinal)
+        return lo, max(lo, hi)
+
     def get_last_run_date(self):
         """Trouve la date du dernier run."""
-        for a in sorted(self.activities, key=lambda x: x.get('start_date_local', ''), reverse=True):
-            date_str = a.get('start_date_local', '')[:10]
-            if date_str:
-                return datetime.strptime(date_str, '%Y-%m-%d').date()
+        if len(self.columns) > self._first_dated:
+            return date.fromordinal(int(self.columns.ordinal[-1]))
         return None
 
     def get_last_hard_workout_date(self):
         """Trouve la date de la dernière séance intense."""
-        for a in sorted(self.activities, key=lambda x: x.get('start_date_local', ''), reverse=True):
-            if self._is_hard_workout(a):
-                date_str = a.get('start_date_local', '')[:10]
-                return datetime.strptime(date_str, '%Y-%m-%d').date()
-        return None
+        return self._last_hard_date
 
-    def _is_hard_workout(self, activity):
-        """Détermine si une activité est une séance intense."""
-        # Check par le nom
-        name = (activity.get('name') or '').lower()
-        hard_keywords = ['interval', 'fractionn', 'tempo', 'threshold', 'seuil',
-                         'speed', 'vma', 'vo2', 'fartlek', 'hard']
-        if any(kw in name for kw in hard_keywords):
-            return True
+    def zone_edges(self):
+        """Bornes basses des zones Z2 à Z5 (pour np.digitize)."""
+        zones = self.get_hr_zones()
+        return [zones[z]['min'] for z in ("Z2", "Z3", "Z4", "Z5")]
 
-        # Check par intensité (IF > 0.85)
-        if activity.get('icu_intensity') and activity['icu_intensity'] > 85:
-            return True
-
-        # Check par HR (avg > 88% de max pendant > 20min)
-        avg_hr = activity.get('average_heartrate', 0)
-        duration_min = (activity.get('moving_time', 0) or 0) / 60
-        if avg_hr > 0 and self.max_hr > 0:
-            if avg_hr / self.max_hr > 0.88 and duration_min > 20:
-                return True
-
-        # Check par variabilité (intervalles)
-        if activity.get('variability_index') and activity['variability_index'] > 1.08:
-            return True
-
-        return False
+    def time_in_zone(self, streams, max_gap=5):
+        """
+        Secondes passées dans chaque zone FC (Z1..Z5) par activité.
+        streams: {id: (temps, FC)}. Tous les flux sont concaténés et classés
+        en un seul np.digitize / np.bincount.
+        """
+        ids = list(streams)
+        if not ids:
+            return {}
+        lengths = np.array([len(streams[i][0]) for i in ids])
+        times = np.concatenate([streams[i][0] for i in ids]).astype(np.float64)
+        heartrate = np.concatenate([streams[i][1] for i in ids])
+        owner = np.repeat(np.arange(len(ids)), lengths)
+
+        # Durée de chaque point = écart avec le point précédent (0 en début de flux, pauses plafonnées)
+        dt = np.diff(times, prepend=times[:1])
+        starts = np.cumsum(lengths) - lengths
+        dt[starts[lengths > 0]] = 0
+        dt = np.clip(np.nan_to_num(dt), 0, max_gap)
+
+        valid = heartrate > 0
+        zone = np.digitize(heartrate[valid], self.zone_edges())
+        seconds = np.bincount(owner[valid] * 5 + zone, weights=dt[valid], minlength=len(ids) * 5)
+        return dict(zip(ids, seconds.reshape(len(ids), 5)))
+
+    def set_zone_seconds(self, zone_seconds):
+        """Active la distribution au temps: {id: secondes par zone} alignés sur les colonnes."""
+        n = len(self.columns)
+        self.zone_seconds = np.zeros((n, 5))
+        for k, activity_id in enumerate(self.columns.ids):
+            seconds = zone_seconds.get(activity_id)
+            if seconds is not None:
+                self.zone_seconds[k] = seconds
 
     def get_training_distribution(self, days=21):
-        """Calcule la distribution polarisée sur N jours."""
-        cutoff = datetime.now().date() - timedelta(days=days)
-
-        easy_count = 0
-        hard_count = 0
-        total_runs = 0
-
-        for a in self.activities:
-            date_str = a.get('start_date_local', '')[:10]
-            if not date_str:
-                continue
-            activity_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-            if activity_date < cutoff:
-                continue
+        """
+        Calcule la distribution polarisée sur N jours.
+        En mode temps (set_zone_seconds), les pourcentages portent sur le temps
+        en Z1-Z2 vs Z3-Z5; les runs sans flux FC comptent pour toute leur durée
+        selon leur classification de séance.
+        """
+        cutoff = self.today - timedelta(days=days)
+        lo, hi = self._index_range(cutoff)
 
-            total_runs += 1
-            if self._is_hard_workout(a):
-                hard_count += 1
-            else:
-                easy_count += 1
+        total_runs = hi - lo
+        hard_count = int(np.count_nonzero(self.hard[lo:hi]))
+        easy_count = total_runs - hard_count
 
-        return {
+        distribution = {
             "total_runs": total_runs,
             "easy_count": easy_count,
             "hard_count": hard_count,
             "easy_percent": (easy_count / total_runs * 100) if total_runs > 0 else 100,
-            "hard_percent": (hard_count / total_runs * 100) if total_runs > 0 else 0
+            "hard_percent": (hard_count / total_runs * 100) if total_runs > 0 else 0,
+            "mode": "sessions"
         }
+        if self.zone_seconds is None:
+            return distribution
+
+        zones = self.zone_seconds[lo:hi]
+        covered = zones.sum(axis=1) > 0
+        hard = self.hard[lo:hi]
+        moving_time = self.columns.moving_time[lo:hi].astype(np.float64)
+
+        zone_totals = zones[covered].sum(axis=0)
+        easy_seconds = zone_totals[:2].sum() + moving_time[~covered & ~hard].sum()
+        hard_seconds = zone_totals[2:].sum() + moving_time[~covered & hard].sum()
+        total_seconds = easy_seconds + hard_seconds
+
+        distribution.update({
+            "easy_percent": float(easy_seconds / total_seconds * 100) if total_seconds > 0 else 100,
+            "hard_percent": float(hard_seconds / total_seconds * 100) if total_seconds > 0 else 0,
+            "mode": "time",
+            "easy_minutes": round(easy_seconds / 60),
+            "hard_minutes": round(hard_seconds / 60),
+            "zone_minutes": {f"Z{z + 1}": round(zone_totals[z] / 60) for z in range(5)},
+            "stream_coverage": round(float(covered.mean()), 2) if total_runs > 0 else 0
+        })
+        return distribution
 
-    def get_weekly_stats(self, weeks=4):
-        """Statistiques par semaine pour les N dernières semaines."""
-        stats = []
-        for week in range(weeks):
-            end_date = datetime.now().date() - timedelta(days=week * 7)
-            start_date = end_date - timedelta(days=7)
-
-            week_runs = 0
-            week_distance = 0
-            week_duration = 0
-            week_tss = 0
-
-            for a in self.activities:
-                date_str = a.get('start_date_local', '')[:10]
-                if not date_str:
-                    continue
-                activity_date = datetime.strptime(date_str, '%Y-%m-%d').date()
-                if start_date <= activity_date <= end_date:
-                    week_runs += 1
-                    week_distance += (a.get('distance') or 0) / 1000
-                    week_duration += (a.get('moving_time') or 0) / 60
-                    week_tss += a.get('icu_training_load') or 0
-
-            stats.append({
-                "week": week,
-                "runs": week_runs,
-                "distance_km": round(week_distance, 1),
-                "duration_min": round(week_duration),
-                "tss": round(week_tss)
-            })
+    def _rollup(self, lo, hi, buckets, n_buckets):
+        """Agrégats par bucket en une passe (np.bincount) sur les activités [lo, hi)."""
+        c = self.columns
 
-        return stats
+        def total(values):
+            return np.bincount(buckets, weights=values[lo:hi], minlength=n_buckets)
+
+        runs = np.bincount(buckets, minlength=n_buckets)
+        hard = np.bincount(buckets, weights=self.hard[lo:hi], minlength=n_buckets).astype(int)
+        return {
+            "runs": runs,
+            "distance_km": total(c.distance) / 1000,
+            "duration_min": total(c.moving_time) / 60,
+            "tss": total(c.icu_training_load),
+            "easy_count": runs - hard,
+            "hard_count": hard
+        }
+
+    @staticmethod
+    def _rollup_row(rollup, i):
+        return {
+            "runs": int(rollup['runs'][i]),
+            "distance_km": round(float(rollup['distance_km'][i]), 1),
+            "duration_min": round(float(rollup['duration_min'][i])),
+            "tss": round(float(rollup['tss'][i])),
+            "easy_count": int(rollup['easy_count'][i]),
+            "hard_count": int(rollup['hard_count'][i])
+        }
+
+    def get_weekly_stats(self, weeks=4):
+        """
+        Statistiques par semaine pour les N dernières semaines.
+        Semaine k = 7 jours glissants [J - 7k - 6, J - 7k], sans chevauchement.
+        """
+        today_ordinal = self.today.toordinal()
+        lo, hi = self._index_range(self.today - timedelta(days=weeks * 7 - 1), self.today)
+        buckets = (today_ordinal - self.columns.ordinal[lo:hi]) // 7
+        rollup = self._rollup(lo, hi, buckets, weeks)
+
+        return [{"week": week, **self._rollup_row(rollup, week)} for week in range(weeks)]
+
+    def get_monthly_stats(self, months=12):
+        """Statistiques par mois calendaire pour les N derniers mois (mois en cours inclus)."""
+        current = self.today.year * 12 + self.today.month - 1
+        first = current - (months - 1)
+        start_date = date(first // 12, first % 12 + 1, 1)
+        lo, hi = self._index_range(start_date, self.today)
+
+        # Ordinal → mois calendaire (datetime64[M]) → index de mois absolu
+        days = (self.columns.ordinal[lo:hi] - EPOCH_ORDINAL).astype('datetime64[D]')
+        month_index = days.astype('datetime64[M]').astype(int) + 1970 * 12
+        rollup = self._rollup(lo, hi, month_index - first, months)
+
+        result = []
+        for i in range(months):
+            index = first + i
+            result.append({"month": f"{index // 12:04d}-{index % 12 + 1:02d}", **self._rollup_row(rollup, i)})
+        return result
 
     def get_hr_zones(self):
         """Retourne les zones HR basées sur le seuil (Friel)."""
@@ -820,11 +2431,8 @@ class PolarizedEngine:
         decision_factors.append("→ REPOS demain (défaut prudent)")
         return False, "Récupération par défaut", decision_factors
 
-    def calculate_target_tss(self):
-        """Calcule le TSS cible basé sur le modèle Banister, ajusté par le readiness score."""
-        ctl = self.wellness['ctl']
-        atl = self.wellness['atl']
-
+    def banister_tss(self, ctl, atl):
+        """(TSS pour atteindre le TSB cible, cap ALB) depuis un état CTL/ATL."""
         c = self.ctl_days
         a = self.atl_days
 
@@ -836,6 +2444,11 @@ class PolarizedEngine:
 
         # Cap ALB (sécurité anti-blessure)
         tss_cap = atl - self.alb_lower
+        return tss_for_tsb, tss_cap
+
+    def calculate_target_tss(self):
+        """Calcule le TSS cible basé sur le modèle Banister, ajusté par le readiness score."""
+        tss_for_tsb, tss_cap = self.banister_tss(self.wellness['ctl'], self.wellness['atl'])
 
         final_tss = min(tss_for_tsb, tss_cap)
         final_tss = max(20, final_tss)  # Minimum 20 TSS
@@ -870,7 +2483,8 @@ class PolarizedEngine:
         days_since_hard = (self.tomorrow - last_hard).days if last_hard else 999
 
         decision_log = []
-        decision_log.append(f"Distribution ({self.analysis_window}j): {distribution['easy_percent']:.0f}% easy, {distribution['hard_percent']:.0f}% hard")
+        basis = "temps" if distribution.get('mode') == 'time' else "séances"
+        decision_log.append(f"Distribution ({self.analysis_window}j, {basis}): {distribution['easy_percent']:.0f}% easy, {distribution['hard_percent']:.0f}% hard")
         decision_log.append(f"Jours depuis hard: {days_since_hard}")
         decision_log.append(f"TSB actuel: {tsb:.1f}")
 
@@ -884,18 +2498,21 @@ class PolarizedEngine:
             decision_log.append(f"→ EASY (seulement {days_since_hard}j depuis hard, min {self.min_days_hard})")
             return "easy", decision_log
 
+        # Seuils de distribution autour de la cible (80/20 → 25% / 15% / 22%)
+        hard_share = 100 - self.easy_target
+
         # RÈGLE 3: Trop de hard récemment → Easy
-        if distribution['hard_percent'] > 25:
-            decision_log.append(f"→ EASY (hard% {distribution['hard_percent']:.0f}% > 25%, rétablir 80/20)")
+        if distribution['hard_percent'] > hard_share + 5:
+            decision_log.append(f"→ EASY (hard% {distribution['hard_percent']:.0f}% > {hard_share + 5:.0f}%, rétablir {self.easy_target:.0f}/{hard_share:.0f})")
             return "easy", decision_log
 
         # RÈGLE 4: Pas assez de hard ET bien reposé → Hard
-        if distribution['hard_percent'] < 15 and days_since_hard >= 4:
-            decision_log.append(f"→ HARD (hard% {distribution['hard_percent']:.0f}% < 15%, {days_since_hard}j depuis hard)")
+        if distribution['hard_percent'] < hard_share - 5 and days_since_hard >= 4:
+            decision_log.append(f"→ HARD (hard% {distribution['hard_percent']:.0f}% < {hard_share - 5:.0f}%, {days_since_hard}j depuis hard)")
             return "intervals", decision_log
 
         # RÈGLE 5: Bien reposé et distribution OK → possibilité de hard
-        if tsb > 5 and days_since_hard >= 3 and distribution['hard_percent'] < 22:
+        if tsb > 5 and days_since_hard >= 3 and distribution['hard_percent'] < hard_share + 2:
             decision_log.append(f"→ HARD (TSB positif {tsb:.1f}, distribution OK)")
             return "intervals", decision_log
 
@@ -904,7 +2521,7 @@ class PolarizedEngine:
         if weekly_stats and weekly_stats[0]['distance_km'] > 25:
             decision_log.append(f"→ EASY (volume hebdo {weekly_stats[0]['distance_km']:.0f}km, maintenance)")
         else:
-            decision_log.append(f"→ EASY (défaut polarisé 80/20)")
+            decision_log.append(f"→ EASY (défaut polarisé {self.easy_target:.0f}/{100 - self.easy_target:.0f})")
 
         return "easy", decision_log
 
@@ -971,6 +2588,169 @@ class PolarizedEngine:
         return round(distance_km, 1)
 
 
+# ==============================================================================
+# --- PLANIFICATION MULTI-JOURS (MÉTÉO) ---
+# ==============================================================================
+class TrainingPlanner:
+    """
+    Plan easy / hard / repos sur les prochains jours, tenant compte de la météo.
+
+    Branch-and-bound sur les séquences (3^N, N = 5 jours de prévision):
+    chaque branche simule CTL/ATL jour par jour (Banister), applique les
+    règles de sécurité de PolarizedEngine (readiness, TSB, ACWR, jours entre
+    hard) et le facteur de chaleur du meilleur créneau du jour.
+
+    Score d'un plan = charge réalisée (TSS ajusté chaleur)
+                      - heat_weight x (indice de chaleur - 18) par séance hard
+                      - distribution_weight x écart (points %) à la part hard cible
+    Les séances hard tombent ainsi sur les jours les plus frais réalisables.
+    """
+
+    ACTIONS = ("intervals", "easy", "rest")
+
+    def __init__(self, engine, daily_weather, heat_weight=1.0, distribution_weight=2.0):
+        self.engine = engine
+        self.daily_weather = daily_weather
+        self.heat_weight = heat_weight
+        self.distribution_weight = distribution_weight
+
+        # Facteur / indice de chaleur du meilleur créneau de chaque jour (jour sans prévision: neutre)
+        n = len(daily_weather)
+        temp = np.full(n, np.nan)
+        humidity = np.full(n, np.nan)
+        for k, slot in enumerate(daily_weather):
+            if slot:
+                temp[k] = slot.get('feels_like') or slot.get('temp', 20)
+                humidity[k] = slot.get('humidity', 50)
+        heat_index, factor = heat_adjustment_batch(temp, humidity)
+        known = ~np.isnan(temp)
+        self.heat_index = np.where(known, heat_index, HEAT_INDEX_EDGES[1]).tolist()
+        self.factor = np.where(known, factor, 1.0).tolist()
+        # "Chaleur élevée - privilégier endurance facile": pas de hard à partir de cette tranche
+        self.hard_allowed = [f > HEAT_FACTORS[4] for f in self.factor]
+
+        self.readiness = engine.readiness.get('readiness_score', 1.0)
+        self.ctl_decay = exp(-1.0 / engine.ctl_days)
+        self.atl_decay = exp(-1.0 / engine.atl_days)
+
+        distribution = engine.analyzer.get_training_distribution(engine.analysis_window)
+        self.window_runs = distribution['total_runs']
+        self.window_hard = distribution['hard_count']
+        self.hard_share = 100 - engine.easy_target
+
+    def _load(self, ctl, atl, k):
+        """TSS du jour k depuis l'état simulé (même calcul que calculate_target_tss + chaleur)."""
+        tss_for_tsb, tss_cap = self.engine.banister_tss(ctl, atl)
+        tss = max(20, round(max(20, min(tss_for_tsb, tss_cap)) * self.readiness))
+        return int(tss * self.factor[k])
+
+    def _can_run(self, tsb, acwr, days_since_run, k):
+        """Règles de repos obligatoire de should_run_tomorrow, sur l'état simulé."""
+        if self.factor[k] == 0.0 or self.readiness < 0.6:
+            return False
+        if tsb < -25 or acwr > 1.5:
+            return False
+        if self.readiness < 0.75 and tsb < -10:
+            return False
+        return not (tsb < 0 and days_since_run < 2)
+
+    def _distribution_penalty(self, runs, hard):
+        total = self.window_runs + runs
+        hard_percent = (self.window_hard + hard) / total * 100 if total else 0
+        return self.distribution_weight * abs(hard_percent - self.hard_share)
+
+    def plan(self):
+        """Meilleure séquence: {"days": [...], "score", "nodes"} (jours avec état CTL/ATL projeté)."""
+        engine = self.engine
+        n = len(self.daily_weather)
+        tomorrow = engine.tomorrow
+        last_run = engine.analyzer.get_last_run_date()
+        last_hard = engine.analyzer.get_last_hard_workout_date()
+
+        # Borne optimiste de charge par jour restant: le cap ALB (ATL - alb) croît
+        # au plus de (1 - alb) x (1 - e^(-1/atl)) par jour (+1 pour l'arrondi)
+        atl_growth = (1 - engine.alb_lower) * (1 - self.atl_decay)
+        ceiling = max(1.0, self.readiness)
+        best = {"score": float('-inf'), "actions": None}
+        nodes = 0
+
+        def remaining_bound(atl, k):
+            return sum(
+                (max(20, (atl - engine.alb_lower + j * atl_growth) * ceiling) + 1) * self.factor[k + j]
+                for j in range(n - k)
+            )
+
+        def search(k, ctl, atl, since_run, since_hard, runs, hard, score, actions):
+            nonlocal nodes
+            nodes += 1
+            if k == n:
+                total = score - self._distribution_penalty(runs, hard)
+                if total > best["score"]:
+                    best["score"] = total
+                    best["actions"] = list(actions)
+                return
+            if score + remaining_bound(atl, k) <= best["score"]:
+                return
+
+            tsb = ctl - atl
+            acwr = atl / ctl if ctl > 0 else 1.0
+            can_run = self._can_run(tsb, acwr, since_run, k)
+            for action in self.ACTIONS:
+                if action != "rest" and not can_run:
+                    continue
+                if action == "intervals" and (
+                        not self.hard_allowed[k] or since_hard < engine.min_days_hard
+                        or tsb < engine.tsb_recovery):
+                    continue
+
+                load = self._load(ctl, atl, k) if action != "rest" else 0
+                gain = load
+                if action == "intervals":
+                    gain -= self.heat_weight * max(0.0, self.heat_index[k] - HEAT_INDEX_EDGES[0])
+                actions.append((action, load))
+                search(
+                    k + 1,
+                    ctl * self.ctl_decay + load * (1 - self.ctl_decay),
+                    atl * self.atl_decay + load * (1 - self.atl_decay),
+                    1 if action != "rest" else since_run + 1,
+                    1 if action == "intervals" else since_hard + 1,
+                    runs + (action != "rest"),
+                    hard + (action == "intervals"),
+                    score + gain,
+                    actions
+                )
+                actions.pop()
+
+        ctl, atl = engine.wellness['ctl'], engine.wellness['atl']
+        search(
+            0, ctl, atl,
+            (tomorrow - last_run).days if last_run else 999,
+            (tomorrow - last_hard).days if last_hard else 999,
+            0, 0, 0.0, []
+        )
+
+        days = []
+        for k, (action, load) in enumerate(best["actions"] or []):
+            ctl = ctl * self.ctl_decay + load * (1 - self.ctl_decay)
+            atl = atl * self.atl_decay + load * (1 - self.atl_decay)
+            slot = self.daily_weather[k]
+            days.append({
+                "date": (tomorrow + timedelta(days=k)).isoformat(),
+                "category": action,
+                "type": engine.choose_specific_workout(action, load) if action != "rest" else "rest",
+                "tss": load,
+                "hour": slot.get('hour') if slot else None,
+                "heat_index": round(self.heat_index[k], 1) if slot else None,
+                "adjustment_factor": self.factor[k],
+                "description": slot.get('description') if slot else None,
+                "ctl": round(ctl, 1),
+                "atl": round(atl, 1),
+                "tsb": round(ctl - atl, 1)
+            })
+
+        return {"days": days, "score": round(best["score"], 1), "nodes": nodes}
+
+
 # ==============================================================================
 # --- CONSTRUCTEUR DE WORKOUT ---
 # ==============================================================================
@@ -1034,8 +2814,8 @@ class WorkoutBuilder:
             return f"- {duration_min}m Z2"
 
     def build(self, workout_type, target_tss, duration_min, distance_km,
-              wellness, decision_log, workout_date, weather_info=None):
-        """Construit le workout complet."""
+              wellness, decision_log, workout_date, weather_info=None, workout_hour=None):
+        """Construit le workout complet (à workout_hour, sinon weather.workout_hour)."""
 
         template = self.templates.get(workout_type, self.templates.get('easy'))
 
@@ -1083,7 +2863,7 @@ class WorkoutBuilder:
         weather_text = ""
         if weather_info:
             weather_text = f"""
-Meteo prevue:
+Meteo prevue{f" ({weather_info['hour']}h)" if weather_info.get('hour') is not None else ''}:
 * {weather_info.get('description', '').capitalize()}
 * Temperature: {weather_info.get('temp', 0):.1f} C (ressenti: {weather_info.get('feels_like', weather_info.get('temp', 0)):.1f} C)
 * Humidite: {weather_info.get('humidity', 0)}%
@@ -1120,7 +2900,9 @@ Running Coach v{VERSION} - Polarized Data-Driven
         # Le séparateur "---" et texte "Notes:" indique la fin des steps
         description = workout_doc + "\n\n---\nNotes:" + rationale
 
-        workout_datetime = datetime.combine(workout_date, time(7, 0))
+        if workout_hour is None:
+            workout_hour = self.config.get('weather', {}).get('workout_hour', 7)
+        workout_datetime = datetime.combine(workout_date, time(workout_hour, 0))
 
         return {
             "category": "WORKOUT",
@@ -1135,12 +2917,11 @@ Running Coach v{VERSION} - Polarized Data-Driven
 # ==============================================================================
 # --- FONCTIONS D'EXPORT POUR DASHBOARD ---
 # ==============================================================================
-def _get_initialized_components():
-    """Initialise les composants nécessaires pour les fonctions d'export."""
-    # Charger config
-    config = DEFAULT_CONFIG.copy()
+def load_config(path="config.json"):
+    """Charge config.json fusionné sur DEFAULT_CONFIG (défauts si absent ou invalide)."""
+    config = copy.deepcopy(DEFAULT_CONFIG)
     try:
-        with open("config.json") as f:
+        with open(path) as f:
             user_config = json.load(f)
             for key in user_config:
                 if isinstance(user_config[key], dict) and key in config:
@@ -1149,6 +2930,13 @@ def _get_initialized_components():
                     config[key] = user_config[key]
     except (FileNotFoundError, json.JSONDecodeError):
         pass
+    return config
+
+
+def _get_initialized_components():
+    """Initialise les composants nécessaires pour les fonctions d'export."""
+    # Charger config
+    config = load_config()
 
     # Timezone
     try:
@@ -1167,19 +2955,144 @@ def _get_initialized_components():
 
     weather_api_key = os.environ.get('OPENWEATHER_API_KEY', '')
 
-    # API
-    api = IntervalsAPI(athlete_id, api_key)
+    # API (session keep-alive partagée entre les appels)
+    http_config = config.get('http', DEFAULT_CONFIG['http'])
+    session = get_http_session(http_config.get('pool_connections'), http_config.get('pool_maxsize'))
+    api = IntervalsAPI(athlete_id, api_key, session=session)
 
     return config, today, api, weather_api_key, None
 
 
-def get_current_wellness() -> dict:
+# ==============================================================================
+# --- SNAPSHOT ATHLÈTE (une requête = un aller-retour par ressource) ---
+# ==============================================================================
+class AthleteSnapshot:
+    """
+    Données Intervals.icu d'un cycle de requête ou de rafraîchissement.
+
+    Chaque ressource (wellness, historique wellness, profil, sport-settings,
+    activités, événements) est chargée paresseusement et au plus une fois.
+    Une plage plus courte qu'une plage déjà chargée est servie par filtrage
+    local. Les fonctions d'export acceptent un snapshot partagé.
+    """
+
+    def __init__(self, config, today, api, weather_api_key=''):
+        self.config = config
+        self.today = today
+        self.api = api
+        self.weather_api_key = weather_api_key
+        self._values = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @classmethod
+    def create(cls):
+        """Construit un snapshot depuis config.json et l'environnement (None si non configuré)."""
+        config, today, api, weather_api_key, _ = _get_initialized_components()
+        if not api:
+            return None
+        return cls(config, today, api, weather_api_key)
+
+    def _load(self, key, loader):
+        """Charge une ressource une seule fois, même en cas d'appels concurrents."""
+        if key in self._values:
+            return self._values[key]
+        with self._locks_lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._values:
+                self._values[key] = loader()
+        return self._values[key]
+
+    def _load_range(self, kind, days, loader, date_of):
+        """Charge une plage [today - days, today], ou la filtre depuis une plage plus large déjà chargée."""
+        for key, items in list(self._values.items()):
+            if key[0] == kind and key[1] > days:
+                cutoff = (self.today - timedelta(days=days)).isoformat()
+                return [item for item in items if (date_of(item) or '') >= cutoff]
+        return self._load((kind, days), lambda: loader(self.today - timedelta(days=days), self.today))
+
+    def _pmc_source(self):
+        return self.config.get('banister', {}).get('pmc_source', 'intervals')
+
+    def local_pmc(self, days):
+        """CTL/ATL/TSB recalculés localement (BanisterModel) depuis les activités, sur N jours."""
+        warmup = self.config.get('banister', {}).get('pmc_warmup_days', 252)
+
+        def compute(start_date, end_date):
+            activities = self.activities((end_date - start_date).days + warmup)
+            if not activities:
+                return []
+            model = BanisterModel.from_config(self.config)
+            return model.series(activities, start_date - timedelta(days=warmup), end_date)[warmup:]
+
+        return self._load_range('local_pmc', days, compute, lambda w: w.get('date'))
+
+    def _local_wellness(self):
+        series = self.local_pmc(0)
+        if not series:
+            return None
+        today = series[-1]
+        return {key: today[key] for key in ("ctl", "atl", "tsb", "resting_hr", "hrv")}
+
+    def wellness(self):
+        def load():
+            if self._pmc_source() == 'local':
+                return self._local_wellness()
+            wellness = self.api.get_wellness(self.today)
+            if wellness is None:
+                print("Info: wellness Intervals.icu indisponible, CTL/ATL calculés localement")
+                return self._local_wellness()
+            return wellness
+        return self._load(('wellness',), load)
+
+    def wellness_range(self, days):
+        def load(start_date, end_date):
+            if self._pmc_source() == 'local':
+                return self.local_pmc(days)
+            return self.api.get_wellness_range(start_date, end_date) or self.local_pmc(days)
+        return self._load_range('wellness_range', days, load, lambda w: w.get('date'))
+
+    def athlete_info(self):
+        return dict(self._load(('athlete_info',), self.api.get_athlete_info) or {})
+
+    def sport_settings(self, sport_type="Run"):
+        return self._load(('sport_settings', sport_type), lambda: self.api.get_sport_settings(sport_type))
+
+    def activities(self, days):
+        return self._load_range(
+            'activities', days,
+            lambda start, end: load_activities(self.config, self.api, start, end),
+            lambda a: (a.get('start_date_local') or '')[:10]
+        )
+
+    def events(self, start_date: date, end_date: date):
+        return self._load(('events', start_date, end_date), lambda: self.api.get_events(start_date, end_date))
+
+    def prefetch(self, wellness_days=None, activity_days=60, extra=None):
+        """
+        Charge en parallèle les ressources indépendantes du pipeline de décision.
+        extra: appels indépendants supplémentaires (ex: météo), dont les résultats sont retournés.
+        """
+        tasks = {
+            'wellness': self.wellness,
+            'wellness_range': lambda: self.wellness_range(wellness_days or READINESS_HISTORY_DAYS),
+            'athlete_info': self.athlete_info,
+            'sport_settings': lambda: self.sport_settings("Run"),
+            'activities': lambda: self.activities(activity_days)
+        }
+        tasks.update(extra or {})
+        max_workers = self.config.get('http', {}).get('max_parallel_requests')
+        return fetch_concurrently(tasks, max_workers)
+
+
+def get_current_wellness(snapshot=None) -> dict:
     """Retourne l'état de forme actuel (CTL, ATL, TSB, ACWR)."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return {"error": "API non configurée"}
 
-    wellness = api.get_wellness(today)
+    wellness = snapshot.wellness()
     if not wellness:
         return {"error": "Données wellness non disponibles"}
 
@@ -1195,23 +3108,24 @@ def get_current_wellness() -> dict:
         "acwr": round(acwr, 2),
         "resting_hr": wellness.get('resting_hr'),
         "hrv": wellness.get('hrv'),
-        "date": today.isoformat()
+        "date": snapshot.today.isoformat()
     }
 
 
-def get_distribution(days: int = 21) -> dict:
+def get_distribution(days: int = 21, snapshot=None) -> dict:
     """Retourne la distribution polarisée (easy vs hard) sur N jours."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return {"error": "API non configurée"}
 
-    athlete_info = api.get_athlete_info()
-    activities = api.get_activities(today - timedelta(days=60), today)
+    athlete_info = snapshot.athlete_info()
+    activities = snapshot.activities(60)
 
     analyzer = DataAnalyzer(activities, athlete_info)
+    apply_distribution_mode(snapshot.config, snapshot.api, analyzer)
     distribution = analyzer.get_training_distribution(days)
 
-    return {
+    result = {
         "total_runs": distribution['total_runs'],
         "easy_count": distribution['easy_count'],
         "hard_count": distribution['hard_count'],
@@ -1219,55 +3133,108 @@ def get_distribution(days: int = 21) -> dict:
         "hard_percent": round(distribution['hard_percent'], 1),
         "target_easy": 80,
         "target_hard": 20,
-        "days_analyzed": days
+        "days_analyzed": days,
+        "mode": distribution['mode']
     }
+    if distribution['mode'] == 'time':
+        for key in ("easy_minutes", "hard_minutes", "zone_minutes", "stream_coverage"):
+            result[key] = distribution[key]
+    return result
 
 
-def get_readiness_score() -> dict:
+def get_readiness_score(snapshot=None) -> dict:
     """Retourne le readiness score basé sur algorithme scientifique multi-facteurs."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return {"error": "API non configurée"}
 
-    # Récupérer 14 jours d'historique pour le calcul
-    start_date = today - timedelta(days=14)
-    wellness_history = api.get_wellness_range(start_date, today)
+    # Historique pour les fenêtres glissantes (baseline HRV 60 jours)
+    wellness_history = snapshot.wellness_range(READINESS_HISTORY_DAYS)
 
     if not wellness_history:
         return {"error": "Données wellness non disponibles"}
 
     readiness = calculate_readiness_score(wellness_history)
-    readiness['date'] = today.isoformat()
+    readiness['date'] = snapshot.today.isoformat()
     return readiness
 
 
-def get_next_workout_info() -> dict:
+def get_readiness_history(days: int = 30, snapshot=None) -> list:
+    """Retourne le readiness score et ses composantes pour chaque jour sur N jours (calcul vectorisé)."""
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
+        return []
+
+    # Jours supplémentaires pour que la baseline FC repos soit remplie dès le premier jour
+    wellness_history = snapshot.wellness_range(days + READINESS_HISTORY_DAYS)
+    if not wellness_history:
+        return []
+    batch = calculate_readiness_batch(wellness_history)
+    cutoff = (snapshot.today - timedelta(days=days)).isoformat()
+
+    def value(key, i, digits=1):
+        v = batch[key][i]
+        return None if np.isnan(v) else round(float(v), digits)
+
+    result = []
+    for i, day in enumerate(batch['dates']):
+        if (day or '') < cutoff:
+            continue
+        result.append({
+            "date": day,
+            "readiness_score": float(batch['readiness_score'][i]),
+            "status": str(batch['status'][i]),
+            "modifiers": dict(zip(READINESS_COMPONENTS, batch['modifiers'][i].tolist())),
+            "tsb": value('tsb', i),
+            "resting_hr": value('resting_hr', i, 0),
+            "resting_hr_baseline": value('resting_hr_baseline', i),
+            "sleep_avg_3d": value('sleep_avg_3d', i),
+            "ramp_rate": value('ramp_rate', i, 2),
+            "acwr": value('acwr', i, 2),
+            "hrv": value('hrv', i),
+            "hrv_7d": value('hrv_7d', i, 3),
+            "hrv_baseline": value('hrv_baseline', i, 3),
+            "hrv_cv": value('hrv_cv', i)
+        })
+    return result
+
+
+def get_next_workout_info(snapshot=None) -> dict:
     """Retourne les informations sur la prochaine séance planifiée."""
-    config, today, api, weather_api_key, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return {"error": "API non configurée"}
 
+    config = snapshot.config
+    today = snapshot.today
+    weather_api_key = snapshot.weather_api_key
     tomorrow = today + timedelta(days=1)
 
+    # Appels amont indépendants en parallèle (wellness, profil, activités, météo)
+    fetched = snapshot.prefetch(extra={
+        'weather': lambda: fetch_weather_forecast(config, weather_api_key, tomorrow)
+    })
+
     # Données
-    wellness = api.get_wellness(today)
+    wellness = snapshot.wellness()
     if not wellness:
         return {"error": "Données wellness non disponibles"}
 
-    # Récupérer l'historique wellness pour le readiness score (14 jours)
-    wellness_history = api.get_wellness_range(today - timedelta(days=14), today)
+    # Récupérer l'historique wellness pour le readiness score (baseline HRV 60 jours)
+    wellness_history = snapshot.wellness_range(READINESS_HISTORY_DAYS)
 
-    athlete_info = api.get_athlete_info()
-    activities = api.get_activities(today - timedelta(days=60), today)
+    athlete_info = snapshot.athlete_info()
+    activities = snapshot.activities(60)
 
     # Sport settings
-    sport_settings = api.get_sport_settings("Run")
+    sport_settings = snapshot.sport_settings("Run")
     if sport_settings.get('lthr'):
         athlete_info['lthr'] = sport_settings['lthr']
     if sport_settings.get('max_hr'):
         athlete_info['max_hr'] = sport_settings['max_hr']
 
     analyzer = DataAnalyzer(activities, athlete_info)
+    apply_distribution_mode(config, snapshot.api, analyzer)
     engine = PolarizedEngine(config, analyzer, wellness, today, wellness_history)
 
     # Décision course/repos
@@ -1295,20 +3262,12 @@ def get_next_workout_info() -> dict:
     templates = config.get('workout_templates', DEFAULT_CONFIG['workout_templates'])
     template = templates.get(workout_type, templates.get('easy'))
 
-    # Météo
+    # Météo (déjà récupérée pendant le prefetch)
     weather_info = None
-    weather_config = config.get('weather', DEFAULT_CONFIG['weather'])
-    if weather_config.get('enabled', True) and weather_api_key:
-        location = weather_config.get('location', DEFAULT_CONFIG['weather']['location'])
-        workout_hour = weather_config.get('workout_hour', 7)
-        weather_api = WeatherAPI(
-            api_key=weather_api_key,
-            lat=location['lat'],
-            lon=location['lon']
-        )
-        weather_data = weather_api.get_forecast(tomorrow, workout_hour)
-        if weather_data:
-            _, weather_info, _ = calculate_heat_adjustment(weather_data)
+    weather_data = fetched.get('weather')
+    if weather_data:
+        _, weather_info, _ = calculate_heat_adjustment(weather_data)
+        record_weather_days(config, snapshot.api.athlete_id, tomorrow, [weather_data])
 
     return {
         "date": tomorrow.isoformat(),
@@ -1325,13 +3284,94 @@ def get_next_workout_info() -> dict:
     }
 
 
-def get_today_workout() -> dict:
+def get_heat_tss_history(days: int = 180, snapshot=None) -> list:
+    """
+    TSS brut vs ajusté chaleur par jour de course sur N jours, depuis le store
+    local (activités jointes à la météo historisée, une seule lecture de plage).
+    """
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
+        return []
+
+    store = get_activity_store(snapshot.config, snapshot.api.athlete_id)
+    if store is None:
+        return []
+
+    # Synchronise le store sur la plage (sans effet si déjà chargée par le snapshot)
+    snapshot.activities(days)
+    today = snapshot.today
+    try:
+        rows = store.heat_tss(today - timedelta(days=days), today)
+    except Exception as e:
+        print(f"ERREUR historique météo: {e}")
+        return []
+
+    return [
+        {
+            "date": day,
+            "runs": runs,
+            "tss": round(tss),
+            "heat_adjusted_tss": round(tss * factor) if factor is not None else round(tss),
+            "temp": temp,
+            "humidity": humidity,
+            "heat_index": heat_index,
+            "adjustment_factor": factor
+        }
+        for day, runs, tss, temp, humidity, heat_index, factor in rows
+    ]
+
+
+def get_training_plan(days: int = None, snapshot=None) -> dict:
+    """Plan easy / hard / repos des prochains jours, séances hard placées sur les jours les plus frais."""
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
+        return {"error": "API non configurée"}
+
+    config = snapshot.config
+    planner_config = config.get('planner', DEFAULT_CONFIG['planner'])
+    days = days or planner_config.get('horizon_days', 5)
+    tomorrow = snapshot.today + timedelta(days=1)
+
+    fetched = snapshot.prefetch(extra={
+        'outlook': lambda: fetch_weather_outlook(config, snapshot.weather_api_key, tomorrow, days)
+    })
+
+    wellness = snapshot.wellness()
+    if not wellness:
+        return {"error": "Données wellness non disponibles"}
+
+    athlete_info = snapshot.athlete_info()
+    sport_settings = snapshot.sport_settings("Run")
+    if sport_settings.get('lthr'):
+        athlete_info['lthr'] = sport_settings['lthr']
+    if sport_settings.get('max_hr'):
+        athlete_info['max_hr'] = sport_settings['max_hr']
+
+    analyzer = DataAnalyzer(snapshot.activities(60), athlete_info)
+    apply_distribution_mode(config, snapshot.api, analyzer)
+    engine = PolarizedEngine(config, analyzer, wellness, snapshot.today,
+                             snapshot.wellness_range(READINESS_HISTORY_DAYS))
+
+    outlook = fetched.get('outlook') or [None] * days
+    record_weather_days(config, snapshot.api.athlete_id, tomorrow, outlook)
+
+    planner = TrainingPlanner(
+        engine,
+        outlook,
+        heat_weight=planner_config.get('heat_weight', 1.0),
+        distribution_weight=planner_config.get('distribution_weight', 2.0)
+    )
+    return planner.plan()
+
+
+def get_today_workout(snapshot=None) -> dict:
     """Récupère le workout planifié pour aujourd'hui depuis Intervals.icu."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return None
 
-    events = api.get_events(today, today)
+    today = snapshot.today
+    events = snapshot.events(today, today)
     for event in events:
         if event.get('category') == 'WORKOUT' and 'Run' in str(event.get('type', '')):
             name = event.get('name', '')
@@ -1368,19 +3408,20 @@ def get_today_workout() -> dict:
     return None
 
 
-def get_activity_history(days: int = 60) -> list:
+def get_activity_history(days: int = 60, snapshot=None) -> list:
     """Retourne l'historique des activités sur N jours."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return []
 
-    activities = api.get_activities(today - timedelta(days=days), today)
+    activities = snapshot.activities(days)
 
     result = []
     for a in activities:
         if a.get('type') != 'Run':
             continue
         result.append({
+            "id": str(a['id']) if a.get('id') is not None else None,
             "date": a.get('start_date_local', '')[:10],
             "name": a.get('name', 'Run'),
             "distance_km": round((a.get('distance') or 0) / 1000, 2),
@@ -1394,21 +3435,19 @@ def get_activity_history(days: int = 60) -> list:
     return sorted(result, key=lambda x: x['date'], reverse=True)
 
 
-def get_wellness_history(days: int = 30) -> list:
+def get_wellness_history(days: int = 30, snapshot=None) -> list:
     """Retourne l'historique wellness (CTL, ATL, TSB) sur N jours."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return []
 
-    start_date = today - timedelta(days=days)
-    wellness_data = api.get_wellness_range(start_date, today)
+    # Copies: le snapshot est partagé entre plusieurs fonctions d'export
+    return [dict(w) for w in snapshot.wellness_range(days)]
 
-    return wellness_data
 
-
-def get_wellness_history_with_acwr(days: int = 30) -> list:
+def get_wellness_history_with_acwr(days: int = 30, snapshot=None) -> list:
     """Retourne l'historique wellness avec ACWR calcule pour chaque jour."""
-    history = get_wellness_history(days)
+    history = get_wellness_history(days, snapshot)
     for item in history:
         ctl = item.get('ctl', 0)
         atl = item.get('atl', 0)
@@ -1416,42 +3455,777 @@ def get_wellness_history_with_acwr(days: int = 30) -> list:
     return history
 
 
-def get_weekly_tss(weeks: int = 8) -> list:
+def get_weekly_tss(weeks: int = 8, snapshot=None) -> list:
     """Retourne le TSS par semaine sur N semaines."""
-    config, today, api, _, _ = _get_initialized_components()
-    if not api:
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
         return []
 
-    athlete_info = api.get_athlete_info()
-    activities = api.get_activities(today - timedelta(days=weeks * 7 + 7), today)
+    athlete_info = snapshot.athlete_info()
+    activities = snapshot.activities(weeks * 7)
 
-    analyzer = DataAnalyzer(activities, athlete_info)
+    analyzer = DataAnalyzer(activities, athlete_info, today=snapshot.today)
     return analyzer.get_weekly_stats(weeks)
 
 
+def get_monthly_stats(months: int = 12, snapshot=None) -> list:
+    """Retourne les agrégats par mois calendaire sur N mois."""
+    snapshot = snapshot or AthleteSnapshot.create()
+    if not snapshot:
+        return []
+
+    today = snapshot.today
+    first = today.year * 12 + today.month - 1 - (months - 1)
+    start_date = date(first // 12, first % 12 + 1, 1)
+
+    athlete_info = snapshot.athlete_info()
+    activities = snapshot.activities((today - start_date).days)
+
+    analyzer = DataAnalyzer(activities, athlete_info, today=today)
+    return analyzer.get_monthly_stats(months)
+
+
+# ==============================================================================
+# --- BACKTEST (rejeu historique du moteur, sans réseau) ---
+# ==============================================================================
+def run_backtest(config, activities, start_date: date, end_date: date,
+                 athlete_info=None, wellness_history=None):
+    """
+    Rejoue les décisions de PolarizedEngine pour chaque jour de [start_date, end_date].
+
+    Chaque jour J est traité comme "aujourd'hui" (décision pour J+1) avec
+    uniquement les données disponibles à J: activités des 60 jours
+    précédents et wellness jusqu'à J. Sans wellness_history, CTL/ATL/TSB
+    viennent du modèle Banister local. La météo n'est pas rejouée.
+
+    Retourne {"days": [décision par jour], "summary": {statistiques}}
+    """
+    athlete_info = athlete_info or {}
+    activities = sorted(
+        (a for a in activities if a.get('start_date_local')),
+        key=lambda a: a['start_date_local']
+    )
+    activity_dates = [a['start_date_local'][:10] for a in activities]
+
+    # Wellness par jour: historique fourni, sinon PMC local (avec période de chauffe)
+    if wellness_history:
+        wellness_by_date = {w['date']: w for w in wellness_history}
+    else:
+        warmup = config.get('banister', DEFAULT_CONFIG['banister']).get('pmc_warmup_days', 252)
+        model = BanisterModel.from_config(config)
+        series = model.series(activities, start_date - timedelta(days=warmup + READINESS_HISTORY_DAYS), end_date)
+        wellness_by_date = {w['date']: w for w in series}
+
+    days = []
+    day = start_date
+    while day <= end_date:
+        wellness = wellness_by_date.get(day.isoformat())
+        if not wellness:
+            day += timedelta(days=1)
+            continue
+
+        history = [
+            wellness_by_date[d.isoformat()]
+            for d in (day - timedelta(days=offset) for offset in range(READINESS_HISTORY_DAYS, -1, -1))
+            if d.isoformat() in wellness_by_date
+        ]
+
+        # Fenêtre de 60 jours se terminant à J (activités triées par date)
+        lo = bisect_left(activity_dates, (day - timedelta(days=60)).isoformat())
+        hi = bisect_right(activity_dates, day.isoformat())
+        analyzer = DataAnalyzer(activities[lo:hi], athlete_info, today=day)
+        engine = PolarizedEngine(config, analyzer, wellness, day, history)
+
+        should_run, reason, _ = engine.should_run_tomorrow()
+        row = {
+            "date": engine.tomorrow.isoformat(),
+            "ctl": round(wellness['ctl'], 1),
+            "atl": round(wellness['atl'], 1),
+            "tsb": round(wellness['tsb'], 1),
+            "readiness": engine.readiness.get('readiness_score', 1.0),
+            "run": should_run,
+            "category": "rest",
+            "workout_type": "rest",
+            "target_tss": 0,
+            "reason": reason
+        }
+        if should_run:
+            tss_data = engine.calculate_target_tss()
+            category, _ = engine.select_workout_type()
+            row["category"] = category
+            row["workout_type"] = engine.choose_specific_workout(category, tss_data['target_tss'])
+            row["target_tss"] = tss_data['target_tss']
+        days.append(row)
+        day += timedelta(days=1)
+
+    return {"days": days, "summary": summarize_backtest(days)}
+
+
+def summarize_backtest(days):
+    """Statistiques agrégées d'un backtest."""
+    run_days = [d for d in days if d['run']]
+    hard_days = [d for d in run_days if d['category'] == 'intervals']
+    type_counts = {}
+    for d in days:
+        type_counts[d['workout_type']] = type_counts.get(d['workout_type'], 0) + 1
+
+    return {
+        "days": len(days),
+        "run_days": len(run_days),
+        "rest_days": len(days) - len(run_days),
+        "hard_days": len(hard_days),
+        "hard_percent": round(len(hard_days) / len(run_days) * 100, 1) if run_days else 0,
+        "avg_target_tss": round(sum(d['target_tss'] for d in run_days) / len(run_days), 1) if run_days else 0,
+        "total_target_tss": sum(d['target_tss'] for d in run_days),
+        "workout_types": type_counts
+    }
+
+
+def print_backtest(result):
+    """Affiche le tableau de décisions compact et le résumé."""
+    print(f"{'Date':<11} {'CTL':>5} {'ATL':>5} {'TSB':>6} {'Ready':>5}  {'Seance':<15} {'TSS':>4}")
+    for d in result['days']:
+        print(f"{d['date']:<11} {d['ctl']:>5.1f} {d['atl']:>5.1f} {d['tsb']:>6.1f} {d['readiness']:>5.2f}  "
+              f"{d['workout_type']:<15} {d['target_tss']:>4}")
+
+    summary = result['summary']
+    print(f"\n{summary['days']} jours | {summary['run_days']} courses | {summary['rest_days']} repos | "
+          f"{summary['hard_percent']:.0f}% hard | TSS moyen {summary['avg_target_tss']:.0f}")
+    print("Types: " + ", ".join(f"{t}={n}" for t, n in sorted(summary['workout_types'].items())))
+
+
+def backtest_cli(argv):
+    """python main.py backtest --start AAAA-MM-JJ --end AAAA-MM-JJ [--lthr N] [--max-hr N] [--athlete ID] [--json]"""
+    parser = argparse.ArgumentParser(prog="main.py backtest", description="Rejoue le moteur sur l'historique local")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, default=date.today() - timedelta(days=1))
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--lthr", type=int, help="FC seuil (sinon estimée depuis les activités)")
+    parser.add_argument("--max-hr", type=int, help="FC max (sinon observée dans les activités)")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    parser.add_argument("--athlete", default=os.environ.get('ATHLETE_ID'),
+                        help="Id athlète Intervals.icu (défaut: variable ATHLETE_ID)")
+    args = parser.parse_args(argv)
+    if not args.athlete:
+        print("Erreur: Credentials manquants (ATHLETE_ID): définir ATHLETE_ID ou passer --athlete")
+        return
+
+    config = load_config(args.config)
+    store = get_activity_store(config, args.athlete)
+    if store is None:
+        print("Erreur: store d'activités désactivé (storage.enabled)")
+        return
+
+    warmup = config.get('banister', DEFAULT_CONFIG['banister']).get('pmc_warmup_days', 252)
+    activities = store.get_activities(args.start - timedelta(days=warmup + 60), args.end)
+    if not activities:
+        print("Erreur: aucune activité locale, lancer d'abord une synchronisation")
+        return
+
+    athlete_info = {}
+    if args.lthr:
+        athlete_info['lthr'] = args.lthr
+    if args.max_hr:
+        athlete_info['max_hr'] = args.max_hr
+
+    result = run_backtest(config, activities, args.start, args.end, athlete_info)
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+    else:
+        print_backtest(result)
+
+
+# ==============================================================================
+# --- SIMULATION ET BALAYAGE DE PARAMÈTRES ---
+# ==============================================================================
+# Paramètres balayables: nom -> (section de config, valeurs par défaut de la grille)
+SWEEP_SPACE = {
+    "target_tsb": ("banister", [-20.0, -15.0, -10.0, -5.0]),
+    "alb_lower_bound": ("banister", [-30.0, -25.0, -20.0]),
+    "tsb_recovery_threshold": ("banister", [-30.0, -25.0, -20.0]),
+    "min_days_between_hard": ("polarized", [1, 2, 3]),
+    "easy_target_percent": ("polarized", [75, 80, 85])
+}
+
+
+def simulate_training(config, activities, start_date: date, n_days: int, athlete_info=None):
+    """
+    Simulation en boucle fermée: à partir de l'état réel à start_date, chaque
+    séance décidée est supposée réalisée (charge = TSS cible) et alimente
+    CTL/ATL et la distribution des jours suivants.
+
+    Retourne les métriques: adhérence à la cible easy_target_percent, ACWR max, gain de CTL.
+    """
+    athlete_info = athlete_info or {}
+    ban_config = config.get('banister', DEFAULT_CONFIG['banister'])
+    model = BanisterModel.from_config(config)
+    templates = config.get('workout_templates', DEFAULT_CONFIG['workout_templates'])
+    intensity_factors = config.get('intensity_factors', DEFAULT_CONFIG['intensity_factors'])
+    easy_target = config.get('polarized', DEFAULT_CONFIG['polarized']).get('easy_target_percent', 80)
+
+    # État initial réel (veille de start_date)
+    warmup = ban_config.get('pmc_warmup_days', 252)
+    history = [a for a in activities if (a.get('start_date_local') or '')[:10] < start_date.isoformat()]
+    series = model.series(history, start_date - timedelta(days=warmup + 15), start_date - timedelta(days=1))
+    wellness_window = series[-15:]
+    ctl, atl = series[-1]['ctl'], series[-1]['atl']
+    ctl_start = ctl
+
+    ctl_decay = exp(-1.0 / model.ctl_days)
+    atl_decay = exp(-1.0 / model.atl_days)
+    # Fenêtre glissante des runs: dicts et colonnes tenus alignés, la séance simulée est ajoutée en fin
+    recent = sorted(
+        (a for a in history
+         if a.get('type') == 'Run' and (a.get('start_date_local') or '')[:10] >= (start_date - timedelta(days=61)).isoformat()),
+        key=lambda a: a['start_date_local']
+    )
+    recent_columns = ActivityColumns.from_activities(recent)
+
+    run_days = 0
+    hard_days = 0
+    peak_acwr = 0.0
+    total_load = 0.0
+
+    for offset in range(n_days):
+        today = start_date + timedelta(days=offset - 1)
+        wellness = {"ctl": ctl, "atl": atl, "tsb": ctl - atl}
+        lo = int(np.searchsorted(recent_columns.ordinal, (today - timedelta(days=60)).toordinal()))
+        recent, recent_columns = recent[lo:], recent_columns[lo:]
+
+        analyzer = DataAnalyzer(recent, athlete_info, today=today, columns=recent_columns)
+        engine = PolarizedEngine(config, analyzer, wellness, today, wellness_window)
+
+        load = 0
+        should_run, _, _ = engine.should_run_tomorrow()
+        if should_run:
+            tss_data = engine.calculate_target_tss()
+            category, _ = engine.select_workout_type()
+            workout_type = engine.choose_specific_workout(category, tss_data['target_tss'])
+            load = tss_data['target_tss']
+            duration_min = engine.calculate_workout_duration(workout_type, load)
+            run_days += 1
+            hard_days += 1 if category == "intervals" else 0
+            session = {
+                "type": "Run",
+                "name": templates.get(workout_type, templates['easy'])['name'],
+                "start_date_local": f"{engine.tomorrow.isoformat()}T07:00:00",
+                "moving_time": duration_min * 60,
+                "distance": engine.estimate_distance(duration_min, workout_type) * 1000,
+                "icu_training_load": load,
+                "icu_intensity": round(intensity_factors.get(workout_type, 0.72) * 100)
+            }
+            recent = recent + [session]
+            recent_columns = recent_columns.concat(ActivityColumns.from_activities([session]))
+
+        # Jour simulé (J+1): mise à jour incrémentale du modèle Banister
+        ctl = ctl * ctl_decay + load * (1 - ctl_decay)
+        atl = atl * atl_decay + load * (1 - atl_decay)
+        total_load += load
+        if ctl > 0:
+            peak_acwr = max(peak_acwr, atl / ctl)
+        # Ramp rate: variation de CTL sur 7 jours (même définition que BanisterModel.compute)
+        week_ago = (engine.tomorrow - timedelta(days=7)).isoformat()
+        ctl_week_ago = next((w['ctl'] for w in wellness_window if w['date'] == week_ago), None)
+        wellness_window = wellness_window[1:] + [{
+            "date": engine.tomorrow.isoformat(), "ctl": ctl, "atl": atl, "tsb": ctl - atl,
+            "ramp_rate": ctl - ctl_week_ago if ctl_week_ago is not None else 0
+        }]
+
+    easy_percent = (run_days - hard_days) / run_days * 100 if run_days else 100
+    return {
+        "run_days": run_days,
+        "hard_days": hard_days,
+        "easy_percent": round(easy_percent, 1),
+        "adherence_gap": round(abs(easy_percent - easy_target), 1),
+        "peak_acwr": round(peak_acwr, 2),
+        "ctl_gain": round(ctl - ctl_start, 1),
+        "total_load": round(total_load)
+    }
+
+
+def sweep_score(metrics):
+    """
+    Score de classement (plus haut = meilleur): gain de CTL, pénalisé par
+    l'écart à la cible polarisée (easy_target_percent) et par un ACWR max au-dessus de 1.3.
+    """
+    return round(
+        metrics['ctl_gain']
+        - 0.5 * metrics['adherence_gap']
+        - 20 * max(0.0, metrics['peak_acwr'] - 1.3),
+        2
+    )
+
+
+def build_sweep_configs(space=None, samples=None, seed=0):
+    """Grille complète (samples=None) ou tirage aléatoire de `samples` combinaisons."""
+    space = space or {name: values for name, (_, values) in SWEEP_SPACE.items()}
+    names = list(space)
+    if samples is None:
+        return [dict(zip(names, combo)) for combo in itertools.product(*(space[n] for n in names))]
+    rng = random.Random(seed)
+    return [{name: rng.choice(space[name]) for name in names} for _ in range(samples)]
+
+
+def apply_sweep_params(config, params):
+    """Copie de config avec les paramètres balayés appliqués dans leur section."""
+    config = copy.deepcopy(config)
+    for name, value in params.items():
+        section = SWEEP_SPACE[name][0]
+        config.setdefault(section, {})[name] = value
+    return config
+
+
+# État partagé des workers: historique chargé une fois par processus
+_sweep_state = {}
+
+
+def _init_sweep_worker(state):
+    _sweep_state.update(state)
+
+
+def _run_sweep_task(params):
+    state = _sweep_state
+    config = apply_sweep_params(state['config'], params)
+    metrics = simulate_training(config, state['activities'], state['start_date'],
+                                state['n_days'], state['athlete_info'])
+    return {"params": params, "metrics": metrics, "score": sweep_score(metrics)}
+
+
+def run_sweep(config, activities, start_date: date, n_days=180, configs=None,
+              athlete_info=None, workers=None):
+    """
+    Évalue chaque combinaison de paramètres par simulation, en parallèle sur
+    un pool de processus. L'historique est transmis une seule fois par
+    worker (initializer), pas à chaque tâche. Résultats triés par score.
+    """
+    configs = configs if configs is not None else build_sweep_configs()
+    state = {
+        "config": config,
+        "activities": activities,
+        "start_date": start_date,
+        "n_days": n_days,
+        "athlete_info": athlete_info or {}
+    }
+    chunksize = max(1, len(configs) // ((workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_sweep_worker,
+                             initargs=(state,)) as pool:
+        results = list(pool.map(_run_sweep_task, configs, chunksize=chunksize))
+    return sorted(results, key=lambda r: r['score'], reverse=True)
+
+
+def sweep_cli(argv):
+    """python main.py sweep --start AAAA-MM-JJ [--days N] [--samples N] [--workers N] [--top N] [--athlete ID]"""
+    parser = argparse.ArgumentParser(prog="main.py sweep", description="Balayage des seuils polarized/banister")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--days", type=int, default=180, help="Horizon simulé (jours)")
+    parser.add_argument("--samples", type=int, help="Tirage aléatoire (sinon grille complète)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, help="Processus (défaut: nb de CPU)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    parser.add_argument("--athlete", default=os.environ.get('ATHLETE_ID'),
+                        help="Id athlète Intervals.icu (défaut: variable ATHLETE_ID)")
+    args = parser.parse_args(argv)
+    if not args.athlete:
+        print("Erreur: Credentials manquants (ATHLETE_ID): définir ATHLETE_ID ou passer --athlete")
+        return
+
+    config = load_config(args.config)
+    store = get_activity_store(config, args.athlete)
+    if store is None:
+        print("Erreur: store d'activités désactivé (storage.enabled)")
+        return
+
+    warmup = config.get('banister', DEFAULT_CONFIG['banister']).get('pmc_warmup_days', 252)
+    activities = store.get_activities(args.start - timedelta(days=warmup + 61), args.start)
+    if not activities:
+        print("Erreur: aucune activité locale, lancer d'abord une synchronisation")
+        return
+
+    configs = build_sweep_configs(samples=args.samples, seed=args.seed)
+    started = time_module.perf_counter()
+    results = run_sweep(config, activities, args.start, args.days, configs, workers=args.workers)
+    elapsed = time_module.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(results[:args.top], indent=2, ensure_ascii=False))
+        return
+
+    print(f"{len(configs)} configurations simulées sur {args.days} jours en {elapsed:.1f}s\n")
+    names = list(SWEEP_SPACE)
+    print(f"{'Score':>6} {'Easy%':>6} {'ACWR':>5} {'dCTL':>6}  " + " ".join(f"{n:>22}" for n in names))
+    for r in results[:args.top]:
+        m = r['metrics']
+        print(f"{r['score']:>6.1f} {m['easy_percent']:>6.1f} {m['peak_acwr']:>5.2f} {m['ctl_gain']:>6.1f}  "
+              + " ".join(f"{r['params'][n]:>22}" for n in names))
+
+
+# ==============================================================================
+# --- IMPORT FIT (hors ligne) ---
+# ==============================================================================
+FIT_EPOCH = 631065600           # 1989-12-31T00:00:00Z en secondes Unix
+FIT_ID_PREFIX = "fit-"
+
+# Type de base FIT (5 bits de poids faible) → (format struct, valeur invalide)
+FIT_BASE_TYPES = {
+    0: ('B', 0xFF), 1: ('b', 0x7F), 2: ('B', 0xFF), 3: ('h', 0x7FFF), 4: ('H', 0xFFFF),
+    5: ('i', 0x7FFFFFFF), 6: ('I', 0xFFFFFFFF), 7: (None, None), 8: ('f', None), 9: ('d', None),
+    10: ('B', 0), 11: ('H', 0), 12: ('I', 0), 13: ('B', 0xFF),
+    14: ('q', 0x7FFFFFFFFFFFFFFF), 15: ('Q', 0xFFFFFFFFFFFFFFFF), 16: ('Q', 0)
+}
+
+FIT_SPORTS = {1: "Run", 2: "Ride", 5: "Swim", 11: "Walk", 17: "Hike"}
+
+# Messages FIT utilisés (numéro global)
+FIT_MSG_SESSION = 18
+FIT_MSG_RECORD = 20
+FIT_MSG_WORKOUT = 26
+FIT_MSG_ACTIVITY = 34
+FIT_FIELD_TIMESTAMP = 253
+
+
+def _fit_definition(endian, fields):
+    """Précompile le décodage d'un message: un seul struct.unpack par enregistrement."""
+    formats, decoders = [], []
+    for num, size, base in fields:
+        fmt, invalid = FIT_BASE_TYPES.get(base, (None, None))
+        if fmt is not None and struct.calcsize(fmt) == size:
+            formats.append(fmt)
+            decoders.append((num, base, invalid))
+        else:
+            # Chaînes et tableaux: octets bruts (seules les chaînes sont décodées)
+            formats.append(f"{size}s")
+            decoders.append((num, base, None))
+    return struct.Struct(endian + "".join(formats)), decoders
+
+
+def iter_fit_messages(f):
+    """
+    Décodeur FIT en flux: génère (numéro global, {numéro de champ: valeur})
+    pour chaque message de données, sans charger le fichier en mémoire.
+    Valeurs brutes (sans échelle ni offset), champs invalides omis.
+    Les en-têtes à timestamp compressé sont résolus dans le champ 253.
+    """
+    header = f.read(12)
+    if len(header) < 12 or header[8:12] != b".FIT":
+        raise ValueError("en-tête FIT invalide")
+    data_size = struct.unpack("<I", header[4:8])[0]
+    f.read(header[0] - 12)
+
+    definitions = {}
+    last_timestamp = 0
+    position = 0
+
+    def read(n):
+        nonlocal position
+        data = f.read(n)
+        if len(data) < n:
+            raise ValueError("fichier FIT tronqué")
+        position += n
+        return data
+
+    while position < data_size:
+        record_header = read(1)[0]
+        timestamp = None
+        if record_header & 0x80:
+            # En-tête compressé: 5 bits de décalage sur le dernier timestamp
+            local = (record_header >> 5) & 0x03
+            offset = record_header & 0x1F
+            timestamp = (last_timestamp & ~0x1F) + offset
+            if offset < (last_timestamp & 0x1F):
+                timestamp += 0x20
+        elif record_header & 0x40:
+            # Message de définition
+            local = record_header & 0x0F
+            architecture = read(2)[1]
+            endian = ">" if architecture else "<"
+            global_num, count = struct.unpack(endian + "HB", read(3))
+            raw_fields = read(3 * count)
+            fields = [tuple(raw_fields[i:i + 3]) for i in range(0, len(raw_fields), 3)]
+            fields = [(num, size, base & 0x1F) for num, size, base in fields]
+            developer_size = 0
+            if record_header & 0x20:
+                developer_count = read(1)[0]
+                raw_developer = read(3 * developer_count)
+                developer_size = sum(raw_developer[i + 1] for i in range(0, len(raw_developer), 3))
+            definitions[local] = (global_num, *_fit_definition(endian, fields), developer_size)
+            continue
+        else:
+            local = record_header & 0x0F
+
+        if local not in definitions:
+            raise ValueError(f"message local {local} sans définition")
+        global_num, layout, decoders, developer_size = definitions[local]
+
+        values = {}
+        for (num, base, invalid), value in zip(decoders, layout.unpack(read(layout.size))):
+            if isinstance(value, bytes):
+                if base != 7:
+                    continue
+                value = value.split(b"\0", 1)[0].decode("utf-8", errors="replace")
+                if not value:
+                    continue
+            elif value == invalid or value != value:  # invalide ou NaN
+                continue
+            values[num] = value
+        if developer_size:
+            read(developer_size)
+
+        if FIT_FIELD_TIMESTAMP in values:
+            last_timestamp = values[FIT_FIELD_TIMESTAMP]
+        elif timestamp is not None:
+            values[FIT_FIELD_TIMESTAMP] = last_timestamp = timestamp
+        yield global_num, values
+
+
+def _fit_column(values, scale=1, offset=0):
+    """Liste de valeurs brutes (None = absent) → float32 mis à l'échelle, NaN si absent."""
+    column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    return (column / scale - offset).astype(np.float32)
+
+
+def file_digest(path):
+    """Empreinte SHA-1 du contenu d'un fichier (lecture par blocs)."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_fit_activity(path, digest, timezone_name="UTC", threshold_hr=165, max_gap=5):
+    """
+    Décode un fichier FIT d'activité en (activité, flux), avec les champs
+    lus par DataAnalyzer. La charge est un hrTSS calculé sur le flux FC
+    (à défaut sur la FC moyenne). Retourne None si le fichier n'est pas une activité.
+    """
+    sessions = []
+    workout_name = None
+    local_offset = None
+    record_times, heartrate, speed, cadence, altitude = [], [], [], [], []
+
+    with open(path, 'rb') as f:
+        for message, values in iter_fit_messages(f):
+            if message == FIT_MSG_RECORD and FIT_FIELD_TIMESTAMP in values:
+                record_times.append(values[FIT_FIELD_TIMESTAMP])
+                heartrate.append(values.get(3))
+                speed.append(values.get(73, values.get(6)))       # enhanced_speed, speed (mm/s)
+                cadence.append(values.get(4))
+                altitude.append(values.get(78, values.get(2)))    # enhanced_altitude, altitude (5/m, +500)
+            elif message == FIT_MSG_SESSION:
+                sessions.append(values)
+            elif message == FIT_MSG_ACTIVITY and 5 in values and FIT_FIELD_TIMESTAMP in values:
+                local_offset = values[5] - values[FIT_FIELD_TIMESTAMP]
+            elif message == FIT_MSG_WORKOUT and values.get(8):
+                workout_name = values[8]
+
+    if not sessions:
+        return None
+    session = sessions[0]
+    start = session.get(2) or (record_times[0] if record_times else None)
+    if start is None:
+        return None
+
+    # Heure locale: offset du message activity, sinon fuseau configuré
+    if local_offset is not None:
+        start_local = datetime(1970, 1, 1) + timedelta(seconds=FIT_EPOCH + start + local_offset)
+    else:
+        start_local = datetime.fromtimestamp(FIT_EPOCH + start, tz=ZoneInfo(timezone_name)).replace(tzinfo=None)
+
+    streams = {}
+    if record_times:
+        times = np.array(record_times, dtype=np.float64) - record_times[0]
+        streams = {
+            "time": times.astype(np.float32),
+            "heartrate": _fit_column(heartrate),
+            "velocity_smooth": _fit_column(speed, scale=1000),
+            "cadence": _fit_column(cadence),
+            "altitude": _fit_column(altitude, scale=5, offset=500)
+        }
+
+    moving_time = session.get(8, session.get(7, 0)) / 1000
+    average_heartrate = session.get(16)
+    hr = streams.get("heartrate")
+    if hr is not None and np.isfinite(hr).any():
+        dt = np.clip(np.diff(streams["time"], prepend=0), 0, max_gap)
+        valid = np.isfinite(hr)
+        load = float(np.sum(dt[valid] * (hr[valid] / threshold_hr) ** 2)) / 3600 * 100
+        average_heartrate = average_heartrate or float(np.nanmean(hr))
+    elif average_heartrate:
+        load = moving_time / 3600 * (average_heartrate / threshold_hr) ** 2 * 100
+    else:
+        load = 0
+
+    sport = FIT_SPORTS.get(session.get(5), "Workout")
+    activity = {
+        "id": f"{FIT_ID_PREFIX}{digest[:16]}",
+        "type": sport,
+        "name": workout_name or sport,
+        "start_date_local": start_local.isoformat(timespec='seconds'),
+        "moving_time": round(moving_time),
+        "elapsed_time": round(session.get(7, 0) / 1000),
+        "distance": session[9] / 100 if 9 in session else None,
+        "average_heartrate": round(average_heartrate) if average_heartrate else None,
+        "max_heartrate": session.get(17) or (int(np.nanmax(hr)) if hr is not None and np.isfinite(hr).any() else None),
+        "icu_training_load": round(load),
+        "icu_intensity": None,  # IF Intervals.icu inconnue: la règle FC de classification décide
+        "source": "fit",
+        "fit_file": os.path.basename(path)
+    }
+    return activity, streams
+
+
+# État en lecture seule des processus de décodage (initializer du pool)
+_fit_state = {}
+
+
+def _init_fit_worker(known_hashes, timezone_name, threshold_hr):
+    _fit_state.update(known=known_hashes, timezone=timezone_name, threshold_hr=threshold_hr)
+
+
+def _ingest_fit_task(path):
+    """Empreinte puis décodage d'un fichier (processus du pool): (chemin, empreinte, résultat, erreur)."""
+    try:
+        digest = file_digest(path)
+        if digest in _fit_state['known']:
+            return path, digest, None, None
+        parsed = parse_fit_activity(path, digest, _fit_state['timezone'], _fit_state['threshold_hr'])
+        return path, digest, parsed or False, None
+    except Exception as e:
+        # Fichier corrompu (dates hors plage, fuseau invalide...): signalé, l'import continue
+        return path, None, None, f"{type(e).__name__}: {e}"
+
+
+def ingest_fit_directory(config, directory, athlete_id, workers=None, threshold_hr=None):
+    """
+    Importe les fichiers FIT d'un répertoire (récursif) dans le store d'activités
+    et l'archive de flux. Décodage réparti sur un pool de processus; les fichiers
+    déjà vus (même contenu) sont ignorés, ainsi que les activités déjà présentes
+    (même minute de départ, ex: synchronisées depuis Intervals.icu).
+    Les activités sont rattachées à l'athlète athlete_id.
+    """
+    store = get_activity_store(config, athlete_id)
+    if store is None:
+        return {"error": "store d'activités désactivé (storage.enabled)"}
+    archive = get_stream_archive(config)
+
+    fit_config = config.get('fit_import', DEFAULT_CONFIG['fit_import'])
+    threshold_hr = threshold_hr or fit_config.get('lthr') or int((fit_config.get('max_hr') or 190) * 0.87)
+    timezone_name = config.get('operational_settings', {}).get('timezone', 'UTC')
+    workers = workers or fit_config.get('workers') or os.cpu_count() or 1
+
+    paths = sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names if name.lower().endswith(".fit")
+    )
+    known = store.fit_hashes()
+    summary = {"files": len(paths), "imported": 0, "already_seen": 0, "duplicates": 0,
+               "not_activity": 0, "errors": 0}
+
+    pending, files = [], []
+
+    def flush():
+        existing = store.existing_starts(a['start_date_local'][:16] for a, _, _, _ in pending)
+        new = []
+        for activity, streams, digest, path in pending:
+            start = activity['start_date_local'][:16]
+            if start in existing:
+                summary['duplicates'] += 1
+                files.append((digest, path, None))
+                continue
+            existing.add(start)
+            new.append((activity, streams))
+            files.append((digest, path, activity['id']))
+        store.upsert([activity for activity, _ in new])
+        if archive is not None:
+            for activity, streams in new:
+                archive.append(activity['id'], streams)
+        store.record_fit_files(files)
+        summary['imported'] += len(new)
+        pending.clear()
+        files.clear()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_fit_worker,
+                             initargs=(known, timezone_name, threshold_hr)) as pool:
+        for path, digest, parsed, error in pool.map(_ingest_fit_task, paths, chunksize=8):
+            if error:
+                print(f"ERREUR FIT {path}: {error}")
+                summary['errors'] += 1
+                continue
+            if parsed is None or digest in known:
+                summary['already_seen'] += 1
+                continue
+            known.add(digest)
+            if parsed is False:
+                summary['not_activity'] += 1
+                files.append((digest, path, None))
+                continue
+            activity, streams = parsed
+            pending.append((activity, streams, digest, path))
+            if len(pending) >= 200:
+                flush()
+        flush()
+    return summary
+
+
+def ingest_fit_cli(argv):
+    """python main.py ingest-fit REPERTOIRE [--workers N] [--lthr N] [--athlete ID]"""
+    parser = argparse.ArgumentParser(prog="main.py ingest-fit", description="Import hors ligne d'exports FIT")
+    parser.add_argument("directory")
+    parser.add_argument("--workers", type=int, help="Processus (défaut: nb de CPU)")
+    parser.add_argument("--lthr", type=int, help="FC seuil pour la charge (défaut: fit_import.lthr)")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--athlete", default=os.environ.get('ATHLETE_ID'),
+                        help="Id athlète Intervals.icu (défaut: variable ATHLETE_ID)")
+    args = parser.parse_args(argv)
+    if not args.athlete:
+        print("Erreur: Credentials manquants (ATHLETE_ID): définir ATHLETE_ID ou passer --athlete")
+        return
+
+    config = load_config(args.config)
+    started = time_module.perf_counter()
+    summary = ingest_fit_directory(config, args.directory, args.athlete, workers=args.workers, threshold_hr=args.lthr)
+    if 'error' in summary:
+        print(f"Erreur: {summary['error']}")
+        return
+    elapsed = time_module.perf_counter() - started
+    print(f"{summary['files']} fichiers FIT en {elapsed:.1f}s: {summary['imported']} importés, "
+          f"{summary['already_seen']} déjà vus, {summary['duplicates']} doublons, "
+          f"{summary['not_activity']} hors activité, {summary['errors']} erreurs")
+
+
 # ==============================================================================
 # --- MAIN ---
 # ==============================================================================
+def write_workout_marker(config, workout):
+    """Signale un nouveau workout uploadé (déclenche le rafraîchissement du cache de l'API)."""
+    prewarm_config = config.get('api_prewarm', DEFAULT_CONFIG['api_prewarm'])
+    path = prewarm_config.get('workout_marker_file', DEFAULT_CONFIG['api_prewarm']['workout_marker_file'])
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({
+                "written_at": datetime.now().isoformat(timespec='seconds'),
+                "name": workout.get('name'),
+                "start_date_local": workout.get('start_date_local')
+            }, f)
+    except OSError as e:
+        print(f"Attention: marqueur workout non ecrit ({path}): {e}")
+
+
 def main():
     print(f"\n{'='*60}")
     print(f"  RUNNING COACH v{VERSION} - Polarized Data-Driven")
     print(f"{'='*60}\n")
 
     # Charger config
-    config = DEFAULT_CONFIG.copy()
-    try:
-        with open("config.json") as f:
-            user_config = json.load(f)
-            # Merge configs
-            for key in user_config:
-                if isinstance(user_config[key], dict) and key in config:
-                    config[key].update(user_config[key])
-                else:
-                    config[key] = user_config[key]
-    except FileNotFoundError:
+    if not os.path.exists("config.json"):
         print("Info: Pas de config.json, utilisation des defauts")
-    except json.JSONDecodeError as e:
-        print(f"Attention: Erreur config.json: {e}, utilisation des defauts")
+    config = load_config()
 
     # Timezone
     try:
@@ -1476,31 +4250,41 @@ def main():
     # Clé API météo (optionnelle)
     weather_api_key = os.environ.get('OPENWEATHER_API_KEY', '')
 
-    # API
-    api = IntervalsAPI(athlete_id, api_key)
+    # API (session keep-alive partagée entre les appels)
+    http_config = config.get('http', DEFAULT_CONFIG['http'])
+    session = get_http_session(http_config.get('pool_connections'), http_config.get('pool_maxsize'))
+    api = IntervalsAPI(athlete_id, api_key, session=session)
 
-    # Données
+    # Données: appels indépendants en parallèle (wellness, profil, activités, météo)
     print("\nRecuperation des donnees...")
-    wellness = api.get_wellness(today)
+    snapshot = AthleteSnapshot(config, today, api, weather_api_key)
+    fetched = snapshot.prefetch(extra={
+        'weather': lambda: fetch_weather_forecast(config, weather_api_key, tomorrow)
+    })
+
+    wellness = fetched['wellness']
     if not wellness:
         print("Erreur: Impossible de recuperer wellness")
         return
 
-    # Récupérer l'historique wellness pour le readiness score (14 jours)
-    wellness_history = api.get_wellness_range(today - timedelta(days=14), today)
+    # Historique wellness pour le readiness score (READINESS_HISTORY_DAYS: baseline HRV de 60 jours)
+    wellness_history = fetched['wellness_range']
 
-    athlete_info = api.get_athlete_info()
-    activities = api.get_activities(today - timedelta(days=60), today)
+    athlete_info = fetched['athlete_info']
+    activities = fetched['activities']
 
-    # Récupérer les paramètres HR depuis sport-settings
-    sport_settings = api.get_sport_settings("Run")
+    # Paramètres HR depuis sport-settings
+    sport_settings = fetched['sport_settings']
     if sport_settings.get('lthr'):
         athlete_info['lthr'] = sport_settings['lthr']
     if sport_settings.get('max_hr'):
         athlete_info['max_hr'] = sport_settings['max_hr']
 
-    # Analyseur
+    # Analyseur (en mode temps, les flux des runs récents sont archivés d'abord)
+    if config.get('polarized', {}).get('distribution_mode', 'sessions') == 'time':
+        sync_stream_archive(config, api, activities)
     analyzer = DataAnalyzer(activities, athlete_info)
+    apply_distribution_mode(config, api, analyzer)
     run_count = len(analyzer.activities)
     print(f"OK: {run_count} runs analyses sur 60 jours")
     print(f"OK: FC max: {analyzer.max_hr}, LTHR: {analyzer.threshold_hr}")
@@ -1548,20 +4332,15 @@ def main():
 
     if weather_config.get('enabled', True) and weather_api_key:
         location = weather_config.get('location', DEFAULT_CONFIG['weather']['location'])
-        workout_hour = weather_config.get('workout_hour', 7)
-
-        weather_api = WeatherAPI(
-            api_key=weather_api_key,
-            lat=location['lat'],
-            lon=location['lon']
-        )
 
-        print(f"\nRecuperation meteo pour {location.get('name', 'votre position')}...")
-        weather_data = weather_api.get_forecast(tomorrow, workout_hour)
+        print(f"\nMeteo pour {location.get('name', 'votre position')}...")
+        weather_data = fetched.get('weather')
 
         if weather_data:
             weather_adjustment, weather_info, weather_advice = calculate_heat_adjustment(weather_data)
+            record_weather_days(config, api.athlete_id, tomorrow, [weather_data])
 
+            print(f"  Meilleur creneau: {weather_data.get('hour')}h ({weather_data.get('forecast_time')})")
             print(f"  Prevision: {weather_data['description']}")
             print(f"  Temperature: {weather_data['temp']:.1f} C (ressenti: {weather_data.get('feels_like', weather_data['temp']):.1f} C)")
             print(f"  Humidite: {weather_data['humidity']}%")
@@ -1623,7 +4402,8 @@ def main():
         wellness=wellness,
         decision_log=decision_log,
         workout_date=tomorrow,
-        weather_info=weather_info
+        weather_info=weather_info,
+        workout_hour=weather_data.get('hour') if weather_data else None
     )
 
     print(f"\nWorkout genere pour DEMAIN:")
@@ -1637,6 +4417,7 @@ def main():
         result = api.create_workout(workout)
         if result:
             print("OK: Workout uploade avec succes!")
+            write_workout_marker(config, workout)
         else:
             print("Erreur: Echec de l'upload")
     else:
@@ -1650,4 +4431,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == "backtest":
+        backtest_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "sweep":
+        sweep_cli(sys.argv[2:])
+    elif len(sys.argv) > 1 and sys.argv[1] == "ingest-fit":
+        ingest_fit_cli(sys.argv[2:])
+    else:
+        main()
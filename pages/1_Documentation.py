@@ -261,6 +261,7 @@ elif section == "Metriques cles":
     | Sommeil (3j) | Moyen | Qualite du repos |
     | RampRate | Faible | Vitesse de progression |
     | ACWR | Securite | Risque de blessure |
+    | HRV (ln rMSSD 7j vs 60j) | Moyen | Equilibre du systeme nerveux autonome |
 
     | Score | Interpretation |
     |-------|----------------|